@@ -0,0 +1,306 @@
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import random
+import re
+import shutil
+import socket
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from bench_common import build_record, finish, load_module, median_run, start_server
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Proxy Clientdownload.py')
+
+# 假发布的版本号（不带 v 前缀，正式发布与预发布解析出的版本号一致）
+TAG = '1.0.0'
+RELEASE_ETAG = f'"release-{TAG}"'
+ASSET_ETAG = f'"asset-{TAG}"'
+
+def release_assets(downloader) -> dict:
+    """按被测脚本的下载配置列出每个仓库的发布文件名"""
+    repos = {}
+    for task in downloader.softs:
+        names = [download['sourceName'].replace('{{tagName}}', TAG) for download in task['downloads']]
+        repos.setdefault(task['gitRepo'], []).extend(names)
+    return repos
+
+
+class FakeGitHub(BaseHTTPRequestHandler):
+    """模拟 GitHub API 与发布文件下载：支持 ETag/304、Range/If-Range、跳转、限速与故障注入"""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status, body, headers=None):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        config = self.server.config
+        time.sleep(config['latency'])
+        path = self.path.split('?', 1)[0]
+        match = re.fullmatch(r'/repos/([^/]+/[^/]+)/releases(/latest)?', path)
+        if match:
+            return self.release(match.group(1), latest=bool(match.group(2)))
+        if path.startswith('/redirect/'):
+            # GitHub 的下载地址会跳转到存储服务，多一次往返
+            return self.send_body(302, b'', {'Location': path[len('/redirect'):]})
+        if path.startswith('/dl/'):
+            return self.asset()
+        self.send_body(404, b'{}')
+
+    def release(self, repo, latest):
+        """发布信息，带 ETag 时返回 304"""
+        names = self.server.repos.get(repo)
+        if names is None:
+            return self.send_body(404, b'{"message": "Not Found"}')
+        if self.headers.get('If-None-Match') == RELEASE_ETAG:
+            return self.send_body(304, b'', {'ETag': RELEASE_ETAG})
+        base = f"http://{self.headers['Host']}"
+        prefix = '/redirect' if self.server.config['redirect'] else ''
+        release = {
+            'tag_name': TAG,
+            'assets': [{
+                'name': name,
+                'size': self.server.config['size'],
+                'digest': self.server.digest,
+                'browser_download_url': f"{base}{prefix}/dl/{repo}/{TAG}/{name}",
+            } for name in names]
+        }
+        body = json.dumps(release if latest else [release]).encode()
+        self.send_body(200, body, {'ETag': RELEASE_ETAG, 'Content-Type': 'application/json'})
+
+    def asset(self):
+        """发布文件：按 --bandwidth 限速，按比例返回 500 或传到一半断开连接"""
+        config = self.server.config
+        size = config['size']
+        roll = random.random()
+        if roll < config['fail_rate']:
+            return self.send_body(500, b'')
+
+        start, end, status = 0, size - 1, 200
+        match = re.fullmatch(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+        if_range = self.headers.get('If-Range')
+        if match and (if_range is None or if_range == ASSET_ETAG):
+            start = int(match.group(1))
+            end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+            if start >= size:
+                return self.send_body(416, b'', {'Content-Range': f"bytes */{size}"})
+            status = 206
+        self.send_response(status)
+        self.send_header('ETag', ASSET_ETAG)
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(end - start + 1))
+        if status == 206:
+            self.send_header('Content-Range', f"bytes {start}-{end}/{size}")
+        self.end_headers()
+
+        # 断开的连接只发送一半内容
+        drop = roll < config['fail_rate'] + config['drop_rate'] and end - start > 1
+        stop = start + (end - start + 1) // 2 if drop else end + 1
+        block = self.server.block
+        step = 64 * 1024
+        began = time.perf_counter()
+        position = start
+        try:
+            while position < stop:
+                length = min(step, stop - position)
+                offset = position % len(block)
+                chunk = (block[offset:] + block)[:length]
+                self.wfile.write(chunk)
+                position += length
+                if config['bandwidth']:
+                    # 按已发送量计算应到的时间，超前时等待
+                    ahead = (position - start) / config['bandwidth'] - (time.perf_counter() - began)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        except (BrokenPipeError, ConnectionResetError):
+            return
+        if drop:
+            self.close_connection = True
+            self.connection.shutdown(socket.SHUT_RDWR)
+
+
+def asset_block(size: int) -> bytes:
+    """发布文件内容：固定种子的 1MB 随机数据循环填充"""
+    return random.Random(0).randbytes(min(size, 1024 * 1024))
+
+def asset_digest(size: int) -> str:
+    """发布文件的 sha256 摘要（与 GitHub 的 digest 字段格式一致）"""
+    block = asset_block(size)
+    sha256 = hashlib.sha256()
+    for start in range(0, size, len(block)):
+        sha256.update(block[:min(len(block), size - start)])
+    return f"sha256:{sha256.hexdigest()}"
+
+class FakeGitHubServer(ThreadingHTTPServer):
+    """假 GitHub 服务"""
+    daemon_threads = True
+    request_queue_size = 256
+
+    def handle_error(self, request, client_address):
+        # 注入的断线会产生连接错误，不输出堆栈
+        pass
+
+def serve(config, repos, ready):
+    """假 GitHub 服务的进程入口，开始监听后设置 ready"""
+    random.seed(config['seed'])
+    server = FakeGitHubServer(('127.0.0.1', config['port']), FakeGitHub)
+    server.config = config
+    server.repos = repos
+    server.block = asset_block(config['size'])
+    server.digest = asset_digest(config['size'])
+    ready.set()
+    server.serve_forever()
+
+
+def build_downloader(module, args, workdir: str):
+    """创建下载器：版本文件与下载目录放在临时目录，API 与下载地址指向本地假服务"""
+    class BenchDownload(module.ClientDownload):
+        def get_local_versions(self):
+            self.base_path = Path(workdir)
+            self.version_file_path = self.base_path / 'Log' / 'ClientDownloadVersion.json'
+            for task in self.softs:
+                task['savePath'] = self.base_path
+            return super().get_local_versions()
+
+    downloader = BenchDownload(max_workers=args.workers, per_host=args.per_host,
+                               segments=args.segments,
+                               segment_min_size=args.segment_min_size * 1024 * 1024)
+    downloader.api_url = f"http://127.0.0.1:{args.port}"
+    downloader.github_url = downloader.api_url
+    return downloader
+
+def run_phase(module, args, workdir: str) -> dict:
+    """运行一次 run()，返回耗时与指标报告"""
+    output = contextlib.nullcontext() if args.log else contextlib.redirect_stdout(io.StringIO())
+    with output:
+        downloader = build_downloader(module, args, workdir)
+        start = time.perf_counter()
+        downloader.run()
+        elapsed = time.perf_counter() - start
+    downloader.client.close()
+    report = json.loads(downloader.metrics_path.read_text())
+    return {'seconds': round(elapsed, 3), 'report': report}
+
+def run_once(module, args, files: int) -> dict:
+    """在空目录上依次运行：首次下载、故障后的重试（续传）、无更新时的检查"""
+    workdir = tempfile.mkdtemp(prefix='download-bench-')
+    try:
+        cold = run_phase(module, args, workdir)
+        retries = 0
+        retry_seconds = 0
+        resumed = 0
+        report = cold['report']
+        # 有失败时重复运行，直到全部下载完成（续传已下载的部分）
+        while report['downloads']['ok'] < report['downloads']['files'] and retries < args.max_retries:
+            phase = run_phase(module, args, workdir)
+            report = phase['report']
+            retries += 1
+            retry_seconds += phase['seconds']
+            resumed += report['downloads']['resumed']
+        warm = run_phase(module, args, workdir)
+        complete = sum(1 for path in Path(workdir).iterdir() if path.is_file())
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    downloads = cold['report']['downloads']
+    return {
+        'seconds': cold['seconds'],
+        'mb_per_sec': round(files * args.size_mb / (cold['seconds'] + retry_seconds), 2),
+        'api_ttfb_p50_ms': cold['report']['api']['ttfbP50Ms'],
+        'download_ttfb_p50_ms': downloads['ttfbP50Ms'],
+        'download_ttfb_p99_ms': downloads['ttfbP99Ms'],
+        'failed_first_run': downloads['files'] - downloads['ok'],
+        'retry_runs': retries,
+        'resumed_files': resumed,
+        'complete_files': complete,
+        'connections': sum(pool['connections'] for pool in cold['report']['connections'].values()),
+        'warm_seconds': warm['seconds'],
+        'warm_not_modified': warm['report']['api']['notModified'],
+    }
+
+SCENARIO_KEYS = ('size_mb', 'bandwidth_mb', 'latency', 'fail_rate', 'drop_rate', 'redirect',
+                 'workers', 'per_host', 'segments', 'segment_min_size', 'seed')
+
+COMPARE_KEYS = ('mb_per_sec', 'seconds', 'download_ttfb_p50_ms', 'warm_seconds', 'peak_rss_mb')
+
+def main():
+    parser = argparse.ArgumentParser(description='离线基准测试：本地假 GitHub 服务上测量 ClientDownload 的下载吞吐')
+    parser.add_argument('--size-mb', type=float, default=8, help='每个发布文件的大小MB（默认8）')
+    parser.add_argument('--bandwidth-mb', type=float, default=0,
+                        help='每个连接的带宽MB/秒（默认0，不限速）')
+    parser.add_argument('--latency', type=float, default=0.02, help='每个请求的首字节延迟秒数（默认0.02）')
+    parser.add_argument('--fail-rate', type=float, default=0, help='下载请求返回500的比例（默认0）')
+    parser.add_argument('--drop-rate', type=float, default=0,
+                        help='下载传到一半断开连接的比例（默认0）')
+    parser.add_argument('--redirect', action='store_true', help='下载地址先302跳转（与GitHub一致）')
+    parser.add_argument('--port', type=int, default=8765, help='假服务端口（默认8765）')
+    parser.add_argument('--seed', type=int, default=42, help='故障注入的随机种子（默认42）')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--per-host', type=int, default=4)
+    parser.add_argument('--segments', type=int, default=1)
+    parser.add_argument('--segment-min-size', type=int, default=32, help='分段下载的最小文件MB（默认32）')
+    parser.add_argument('--max-retries', type=int, default=5, help='有失败时最多重新运行几次（默认5）')
+    parser.add_argument('--repeat', type=int, default=3, help='重复次数，取吞吐的中位数那次（默认3）')
+    parser.add_argument('--log', action='store_true', help='保留被测脚本的输出（默认关闭）')
+    parser.add_argument('--output', help='将结果追加写入该JSON lines文件')
+    parser.add_argument('--compare', help='与该JSON lines文件中同场景的最近记录比较')
+    args = parser.parse_args()
+
+    module = load_module(SCRIPT)
+    workdir = tempfile.mkdtemp(prefix='download-bench-')
+    with contextlib.redirect_stdout(io.StringIO()):
+        repos = release_assets(build_downloader(module, args, workdir))
+    shutil.rmtree(workdir, ignore_errors=True)
+    files = sum(len(names) for names in repos.values())
+    config = {
+        'port': args.port,
+        'size': int(args.size_mb * 1024 * 1024),
+        'bandwidth': int(args.bandwidth_mb * 1024 * 1024),
+        'latency': args.latency,
+        'fail_rate': args.fail_rate,
+        'drop_rate': args.drop_rate,
+        'redirect': args.redirect,
+        'seed': args.seed,
+    }
+    server = start_server(serve, (config, repos), '假 GitHub 服务', timeout=30)
+    try:
+        runs = []
+        for i in range(args.repeat):
+            runs.append(run_once(module, args, files))
+            run = runs[-1]
+            print(f"第{i + 1}次: {run['mb_per_sec']} MB/秒, {run['seconds']}秒, "
+                  f"首字节 p50 {run['download_ttfb_p50_ms']}ms, 首次失败 {run['failed_first_run']} 个, "
+                  f"重试 {run['retry_runs']} 轮, 无更新检查 {run['warm_seconds']}秒")
+    finally:
+        server.terminate()
+
+    record = build_record(SCRIPT, args, SCENARIO_KEYS, median_run(runs, 'mb_per_sec'))
+
+    print(f"""
+{'='*60}
+基准测试结果 ({record['revision']}, {files} 个文件 x {args.size_mb} MB, 并发 {args.workers}, 分段 {args.segments}):
+- 吞吐: {record['mb_per_sec']} MB/秒（{args.repeat}次的中位数，含重试）
+- 首字节: API p50 {record['api_ttfb_p50_ms']}ms / 下载 p50 {record['download_ttfb_p50_ms']}ms, p99 {record['download_ttfb_p99_ms']}ms
+- 连接池中的连接: {record['connections']} 个
+- 故障: 首次失败 {record['failed_first_run']} 个，重试 {record['retry_runs']} 轮，续传 {record['resumed_files']} 个，最终完整 {record['complete_files']}/{files}
+- 无更新时的检查: {record['warm_seconds']}秒（304 {record['warm_not_modified']} 次）
+- 峰值内存: {record['peak_rss_mb']} MB
+{'='*60}""")
+
+    finish(record, args, COMPARE_KEYS)
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,95 @@
 import os
 import json
+import hashlib
+import time
+import random
+import signal
+import shutil
+import fcntl
+import argparse
+import threading
 import requests
+from requests.adapters import HTTPAdapter
 from pathlib import Path
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
 class ClientDownload:
-    def __init__(self):
+    def __init__(self, max_workers=1, per_host=4, segments=1, segment_min_size=32 * 1024 * 1024,
+                 catalogue=None, only=None, mirrors=None, mirror_mode='auto'):
         # 设置基础路径和版本文件路径
         self.base_path = Path('/www/wwwroot/clientdownload')
         self.version_file_path = Path('/www/wwwroot/clientdownload/Log/ClientDownloadVersion.json')
         self.client = requests.Session()  # 使用会话来发送HTTP请求
-        # 下载配置
-        self.softs = [
+        self.api_url = 'https://api.github.com'
+        self.github_url = 'https://github.com'
+        # 并发数（1 为逐个处理）；每个主机最多保持 per_host 个连接，连接用满时请求排队等待
+        self.max_workers = max_workers
+        self.adapter = HTTPAdapter(pool_connections=16, pool_maxsize=per_host, pool_block=True)
+        self.client.mount('https://', self.adapter)
+        self.client.mount('http://', self.adapter)
+        self.lock = threading.Lock()  # 保护输出、版本信息与汇总
+        # 版本信息的批量保存：改动先记在内存中，每 flush_interval 秒或每个软件处理完时写入一次
+        self.save_lock = threading.Lock()
+        self.dirty = False
+        self.last_flush = 0
+        self.flush_interval = 5
+        # 下载设置：不小于 segment_min_size 且服务器支持 Range 的文件分成 segments 段并行下载
+        self.segments = segments
+        self.segment_min_size = segment_min_size
+        self.chunk_size = 256 * 1024
+        self.timeout = 60
+        self.rate_limited_until = 0  # GitHub API 速率限制解除的时间
+        self.summary = {}  # 软件名 -> 本次运行的结果，运行结束时汇总输出
+        # 本次运行的请求与下载指标，运行结束时写入 metrics_path（默认与版本文件同目录）
+        self.metrics = self.new_metrics()
+        self.metrics_path = None
+        # 软件清单：catalogue 为清单文件（默认使用内置清单），only 为只处理的软件名，首次使用时才读取
+        self.catalogue_path = Path(catalogue) if catalogue else None
+        self.only = set(only or [])
+        self.catalogue = None
+        # 镜像目录：下载完成的文件按相同的相对路径发布到每个镜像目录
+        self.mirrors = [Path(mirror) for mirror in mirrors or []]
+        self.mirror_mode = mirror_mode  # auto（硬链接 > reflink > 复制）/ link / reflink / copy
+        self.version = self.get_local_versions()  # 获取本地存储的版本信息
+
+    @property
+    def softs(self):
+        # 软件清单，首次访问时加载
+        if self.catalogue is None:
+            self.catalogue = self.load_softs()
+        return self.catalogue
+
+    def load_softs(self):
+        # 读取软件清单文件（JSON 列表，格式同 default_softs）；savePath 为相对 base_path 的目录，
+        # 省略时为 base_path；only 非空时只保留其中的软件
+        if self.catalogue_path:
+            softs = json.loads(self.catalogue_path.read_text(encoding='utf-8'))
+        else:
+            softs = self.default_softs()
+        for task in softs:
+            missing = [key for key in ('name', 'tagMethod', 'gitRepo', 'downloads') if key not in task]
+            if missing:
+                raise ValueError(f"软件清单 {self.catalogue_path} 中 {task.get('name', task)} 缺少 {', '.join(missing)}")
+            task['savePath'] = self.base_path / task.get('savePath', '')
+            task.setdefault('v', 'no')
+            for download in task['downloads']:
+                download.setdefault('saveName', '')
+        if self.only:
+            unknown = self.only - {task['name'] for task in softs}
+            if unknown:
+                print(f"- 软件清单中没有: {', '.join(sorted(unknown))}")
+            softs = [task for task in softs if task['name'] in self.only]
+        return softs
+
+    @staticmethod
+    def default_softs():
+        # 内置的下载配置
+        return [
             {
                 'name': 'Netch',
                 'tagMethod': 'github_release',
                 'gitRepo': 'netchx/Netch',
-                'savePath': self.base_path,
                 'v': 'no',
                 'downloads': [
                     {
@@ -30,7 +103,6 @@ class ClientDownload:
                 'name': 'V2RayU',
                 'tagMethod': 'github_release',
                 'gitRepo': 'yanue/V2rayU',
-                'savePath': self.base_path,
                 'v': 'yes',
                 'downloads': [
                     {
@@ -44,7 +116,6 @@ class ClientDownload:
                 'name': 'ShadowsocksXNG',
                 'tagMethod': 'github_release',
                 'gitRepo': 'shadowsocks/ShadowsocksX-NG',
-                'savePath': self.base_path,
                 'v': 'yes',
                 'downloads': [
                     {
@@ -58,7 +129,6 @@ class ClientDownload:
                 'name': 'ShadowsocksXNGR',
                 'tagMethod': 'github_pre_release',
                 'gitRepo': 'qinyuhang/ShadowsocksX-NG-R',
-                'savePath': self.base_path,
                 'v': 'no',
                 'downloads': [
                     {
@@ -72,7 +142,6 @@ class ClientDownload:
                 'name': 'V2RayNG',
                 'tagMethod': 'github_pre_release',
                 'gitRepo': '2dust/v2rayNG',
-                'savePath': self.base_path,
                 'v': 'no',
                 'downloads': [
                     {
@@ -106,7 +175,6 @@ class ClientDownload:
                 'name': 'ShadowsocksR-Android',
                 'tagMethod': 'github_release',
                 'gitRepo': 'HMBSbige/ShadowsocksR-Android',
-                'savePath': self.base_path,
                 'v': 'no',
                 'downloads': [
                     {
@@ -120,7 +188,6 @@ class ClientDownload:
                 'name': 'ClashVerge',
                 'tagMethod': 'github_release',
                 'gitRepo': 'clash-verge-rev/clash-verge-rev',
-                'savePath': self.base_path,
                 'v': 'yes',
                 'downloads': [
                     {
@@ -154,7 +221,6 @@ class ClientDownload:
                 'name': 'FlClash',
                 'tagMethod': 'github_release',
                 'gitRepo': 'chen08209/FlClash',
-                'savePath': self.base_path,
                 'v': 'yes',
                 'downloads': [
                     {
@@ -178,7 +244,6 @@ class ClientDownload:
                 'name': 'ClashMetaForAndroid',
                 'tagMethod': 'github_release',
                 'gitRepo': 'MetaCubeX/ClashMetaForAndroid',
-                'savePath': self.base_path,
                 'v': 'yes',
                 'downloads': [
                     {
@@ -199,7 +264,6 @@ class ClientDownload:
                 ]
             }
         ]
-        self.version = self.get_local_versions()  # 获取本地存储的版本信息
 
     def get_local_versions(self):
         # 检查并读取版本文件
@@ -214,113 +278,780 @@ class ClientDownload:
             return {}
 
     def set_local_versions(self):
-        # 保存当前版本信息到版本文件
-        with open(self.version_file_path, 'w') as f:
-            json.dump(self.version, f)
+        # 保存当前版本信息到版本文件：写入临时文件并 fsync 后原子替换，
+        # 进程崩溃或断电时版本文件要么是旧内容，要么是完整的新内容
+        with self.save_lock:
+            with self.lock:
+                content = json.dumps(self.version)
+                self.dirty = False
+                self.last_flush = time.time()
+            temp_path = self.version_file_path.with_name(self.version_file_path.name + '.tmp')
+            with open(temp_path, 'w') as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.version_file_path)
+            # 同步目录项，保证改名本身也已落盘
+            dir_fd = os.open(self.version_file_path.parent, os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
 
-    def get_latest_release_tag_name(self, repo):
-        # 获取 GitHub 正式发布版本号
-        url = f"https://api.github.com/repos/{repo}/releases/latest"
+    def flush_versions(self, force=False):
+        # 批量保存：有改动且距上次保存超过 flush_interval 秒（或 force）时才写文件
+        if self.dirty and (force or time.time() - self.last_flush >= self.flush_interval):
+            self.set_local_versions()
+
+    def asset_state(self, task):
+        # 每个文件已完成下载的版本：{文件名: {'tag', 'size', 'digest', 'updatedAt'}}
+        return self.version.setdefault('assets', {}).setdefault(task['name'], {})
+
+    def record_asset(self, task, tag_name, file_name, asset):
+        # 记录一个已完整下载（或校验一致）的文件；该软件的所有文件都完成后才记为最新版本
+        with self.lock:
+            state = self.asset_state(task)
+            state[file_name] = {
+                'tag': tag_name,
+                'size': asset.get('size'),
+                'digest': asset.get('digest'),
+                'updatedAt': datetime.now().timestamp()
+            }
+            names = [download['saveName'] or download['sourceName'].replace('{{tagName}}', tag_name)
+                     for download in task['downloads']]
+            if all(state.get(name, {}).get('tag') == tag_name for name in names):
+                self.version[task['name']] = tag_name
+            self.dirty = True
+
+    def log(self, message):
+        # 并发时保证每条输出完整占一行
+        with self.lock:
+            print(message, flush=True)
+
+    def get_api_release(self, url, pick, strip_v=False):
+        # 条件请求 GitHub API：带上上次的 ETag/Last-Modified，
+        # 未变化时返回 304（不计入速率限制），直接使用缓存的版本号与资源清单
+        cache = self.version.get('httpCache', {}).get(url, {})
+        headers = {}
+        if 'assets' in cache:
+            if cache.get('etag'):
+                headers['If-None-Match'] = cache['etag']
+            if cache.get('lastModified'):
+                headers['If-Modified-Since'] = cache['lastModified']
+        response = self.client.get(url, headers=headers, timeout=self.timeout)
+        self.record_request('api', response)
+        self.note_rate_limit(response)
+        if response.status_code == 304 and 'assets' in cache:
+            return {'tagName': cache['tagName'], 'assets': cache['assets']}
+        response.raise_for_status()
+
+        release = pick(response.json()) or {}
+        tag_name = release.get('tag_name', '')
+        # 去掉前缀 'v'（如果存在），返回纯版本号
+        if strip_v and tag_name.startswith('v'):
+            tag_name = tag_name[1:]
+        # 资源清单：文件名 -> 大小、摘要（GitHub 提供时为 sha256:...）与下载地址
+        assets = {
+            asset['name']: {
+                'size': asset.get('size'),
+                'digest': asset.get('digest'),
+                'url': asset.get('browser_download_url')
+            }
+            for asset in release.get('assets', [])
+        }
+        # 缓存与版本信息一起保存在版本文件中
+        with self.lock:
+            self.version.setdefault('httpCache', {})[url] = {
+                'etag': response.headers.get('ETag'),
+                'lastModified': response.headers.get('Last-Modified'),
+                'tagName': tag_name,
+                'assets': assets
+            }
+        return {'tagName': tag_name, 'assets': assets}
+
+    def new_metrics(self):
+        # 指标记录：每个HTTP请求与每个下载文件各一条
+        return {'startedAt': time.time(), 'requests': [], 'assets': []}
+
+    def record_request(self, kind, response, stats=None):
+        # 记录请求的状态码与首字节时间（发出请求到收到响应头，包含新建连接与 TLS 握手，
+        # 有跳转时累加每一跳）；stats 为所属文件的下载记录
+        hops = response.history + [response]
+        ttfb = round(sum(hop.elapsed.total_seconds() for hop in hops) * 1000, 1)
+        entry = {'kind': kind, 'url': hops[0].url, 'status': response.status_code,
+                 'ttfbMs': ttfb, 'redirects': len(response.history)}
+        with self.lock:
+            self.metrics['requests'].append(entry)
+            if stats is not None:
+                stats['requests'] += 1
+                if stats['ttfbMs'] is None:
+                    stats['ttfbMs'] = ttfb
+
+    def note_rate_limit(self, response):
+        # 记录 API 速率限制：返回 Retry-After 或剩余次数为 0 时，记下限制解除的时间
+        retry_after = response.headers.get('Retry-After', '')
+        reset = response.headers.get('X-RateLimit-Reset', '')
+        until = 0
+        if retry_after.isdigit():
+            until = time.time() + int(retry_after)
+        elif response.headers.get('X-RateLimit-Remaining') == '0' and reset.isdigit():
+            until = int(reset)
+        if until:
+            with self.lock:
+                self.rate_limited_until = max(self.rate_limited_until, until)
+
+    def get_latest_release(self, repo):
+        # 获取 GitHub 正式发布的版本号与资源清单
+        url = f"{self.api_url}/repos/{repo}/releases/latest"
         try:
-            response = self.client.get(url)
-            response.raise_for_status()
-            tag_name = response.json().get('tag_name', '')
-            # 去掉前缀 'v'（如果存在），返回纯版本号
-            if tag_name.startswith('v'):
-                tag_name = tag_name[1:]
-            return tag_name
+            return self.get_api_release(url, lambda release: release, strip_v=True)
         except requests.exceptions.HTTPError as e:
             if e.response.status_code == 404:
-                print(f"- 获取 {repo} 的最新发布版本失败，地址不存在 (404)，跳过...")
+                self.log(f"- 获取 {repo} 的最新发布版本失败，地址不存在 (404)，跳过...")
             else:
-                print(f"- 获取 {repo} 的最新发布版本时发生错误: {e}")
-        return ''
+                self.log(f"- 获取 {repo} 的最新发布版本时发生错误: {e}")
+        except requests.exceptions.RequestException as e:
+            self.log(f"- 获取 {repo} 的最新发布版本时发生请求错误: {e}")
+        return None
 
-    def get_latest_pre_release_tag_name(self, repo):
-        # 获取 GitHub 预发布版本号
-        url = f"https://api.github.com/repos/{repo}/releases"
+    def get_latest_pre_release(self, repo):
+        # 获取 GitHub 预发布的版本号与资源清单
+        # 列表按发布时间倒序，只需第一条
+        url = f"{self.api_url}/repos/{repo}/releases?per_page=1"
         try:
-            response = self.client.get(url)
-            response.raise_for_status()
-            releases = response.json()
-            return releases[0].get('tag_name', '') if releases else ''
+            return self.get_api_release(url, lambda releases: releases[0] if releases else None)
         except requests.exceptions.HTTPError as e:
             if e.response.status_code == 404:
-                print(f"- 获取 {repo} 的预发布版本失败，地址不存在 (404)，跳过...")
+                self.log(f"- 获取 {repo} 的预发布版本失败，地址不存在 (404)，跳过...")
             else:
-                print(f"- 获取 {repo} 的预发布版本时发生错误: {e}")
-        return ''
+                self.log(f"- 获取 {repo} 的预发布版本时发生错误: {e}")
+        except requests.exceptions.RequestException as e:
+            self.log(f"- 获取 {repo} 的预发布版本时发生请求错误: {e}")
+        return None
+
+    def get_latest_release_tag_name(self, repo):
+        # 获取 GitHub 正式发布版本号
+        return (self.get_latest_release(repo) or {}).get('tagName', '')
+
+    def get_latest_pre_release_tag_name(self, repo):
+        # 获取 GitHub 预发布版本号
+        return (self.get_latest_pre_release(repo) or {}).get('tagName', '')
+
+    def file_digest(self, path):
+        # 计算文件的 sha256，格式与 GitHub 资源的 digest 字段一致
+        sha256 = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha256.update(chunk)
+        return f"sha256:{sha256.hexdigest()}"
+
+    def is_same_file(self, file_path, asset):
+        # 本地文件与发布中的资源大小一致，且有 sha256 摘要时摘要也一致
+        if not file_path.is_file():
+            return False
+        if asset.get('size') is not None and file_path.stat().st_size != asset['size']:
+            return False
+        digest = asset.get('digest') or ''
+        if digest.startswith('sha256:'):
+            return self.file_digest(file_path) == digest
+        return asset.get('size') is not None
 
-    def download_file(self, file_name, save_path, url):
-        # 下载并保存文件
-        save_path.mkdir(parents=True, exist_ok=True)
-        print(f"- 开始下载 {file_name}...")
+    def read_part_meta(self, meta_path, url):
+        # 读取未完成下载的记录，地址不一致（如版本已变化）时视为没有记录
         try:
-            response = self.client.get(url, stream=True)
-            response.raise_for_status()  # 检查响应状态
-            with open(save_path / file_name, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
+            meta = json.loads(meta_path.read_text())
+        except (OSError, ValueError):
+            return None
+        return meta if meta.get('url') == url else None
+
+    def write_part_meta(self, meta_path, meta):
+        # 先写临时文件再替换，中断时不会留下半个记录
+        temp_path = meta_path.with_name(meta_path.name + '.tmp')
+        temp_path.write_text(json.dumps(meta))
+        os.replace(temp_path, meta_path)
+
+    def probe_file(self, url, stats=None):
+        # 请求第一个字节，获取跳转后的实际地址、文件大小、ETag 以及是否支持 Range
+        with self.client.get(url, headers={'Range': 'bytes=0-0'}, stream=True,
+                             timeout=self.timeout) as response:
+            self.record_request('probe', response, stats)
+            response.raise_for_status()
+            content_range = response.headers.get('Content-Range', '')
+            size = None
+            if response.status_code == 206 and '/' in content_range:
+                total = content_range.rsplit('/', 1)[1]
+                size = int(total) if total.isdigit() else None
+            elif response.headers.get('Content-Length', '').isdigit():
+                size = int(response.headers['Content-Length'])
+            return {
+                'url': response.url,
+                'size': size,
+                'etag': response.headers.get('ETag'),
+                'ranges': response.status_code == 206 and size is not None
+            }
+
+    def download_single(self, file_name, url, part_path, meta_path, meta, stats):
+        # 单连接下载，已有 .part 文件时用 Range 从断点继续；返回文件总大小（未知时为 None）
+        if meta and meta.get('segments'):
+            # 分段下载的 .part 已预分配到完整大小，文件长度不代表进度，只能从头下载
+            self.log(f"- {file_name} 上次为分段下载，改为单连接从头下载")
+            meta = None
+        offset = part_path.stat().st_size if meta and part_path.exists() else 0
+        headers = {}
+        if offset:
+            headers['Range'] = f"bytes={offset}-"
+            if meta.get('etag'):
+                # 文件已变化时服务器返回完整内容，而不是拼接到旧数据后面
+                headers['If-Range'] = meta['etag']
+        with self.client.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+            self.record_request('download', response, stats)
+            if response.status_code == 416 and offset and offset == meta.get('size'):
+                return offset  # 上次已下载完整，只是未来得及改名
+            response.raise_for_status()
+            if response.status_code == 206:
+                # 只有从断点开始的范围才能追加到 .part 后面，否则丢弃进度下次从头下载
+                if not offset or not response.headers.get('Content-Range', '').startswith(f"bytes {offset}-"):
+                    part_path.unlink(missing_ok=True)
+                    meta_path.unlink(missing_ok=True)
+                    raise requests.exceptions.RequestException(
+                        f"续传响应的范围与断点 {offset} 不符: {response.headers.get('Content-Range')}")
+                self.log(f"- {file_name} 从 {offset} 字节处继续下载")
+                stats['resumedFrom'] = offset
+                total = response.headers.get('Content-Range', '').rsplit('/', 1)[-1]
+                mode = 'ab'
+            else:
+                total = response.headers.get('Content-Length', '')
+                mode = 'wb'
+            size = int(total) if total.isdigit() else None
+            self.write_part_meta(meta_path, {'url': url, 'etag': response.headers.get('ETag'),
+                                             'size': size})
+            with open(part_path, mode) as f:
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
                     if chunk:
                         f.write(chunk)
-            print(f"- {file_name} 下载并保存成功.")
+                        stats['bytes'] += len(chunk)
+        return size
+
+    def download_segment(self, url, fd, segment, meta, meta_path, meta_lock, stats):
+        # 下载一个分段并按偏移直接写入 .part 文件；segment 为 [起点, 终点, 已完成字节数]
+        start, end, done = segment
+        position = start + done
+        if position > end:
+            return True
+        headers = {'Range': f"bytes={position}-{end}"}
+        if meta.get('etag'):
+            headers['If-Range'] = meta['etag']
+        with self.client.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+            self.record_request('segment', response, stats)
+            # 必须是所请求范围的 206 响应，否则（如文件已变化返回 200）放弃该分段
+            if response.status_code != 206 or not response.headers.get(
+                    'Content-Range', '').startswith(f"bytes {position}-{end}/"):
+                return False
+            saved = position
+            for chunk in response.iter_content(chunk_size=self.chunk_size):
+                if position + len(chunk) > end + 1:
+                    return False
+                os.pwrite(fd, chunk, position)
+                position += len(chunk)
+                segment[2] = position - start
+                # 定期记录进度，中断后各分段从记录处继续
+                if position - saved >= 16 * self.chunk_size:
+                    saved = position
+                    with meta_lock:
+                        self.write_part_meta(meta_path, meta)
+        return position == end + 1
+
+    def download_segments(self, file_name, url, info, part_path, meta_path, meta, stats):
+        # 多连接分段下载：预先分配 .part 文件，各分段按偏移写入同一个文件，无需再拼接
+        size = info['size']
+        resumable = (meta and meta.get('segments') and meta.get('size') == size
+                     and meta.get('etag') == info['etag'] and part_path.exists()
+                     and part_path.stat().st_size == size)
+        if resumable:
+            segments = meta['segments']
+            done = sum(segment[2] for segment in segments)
+            self.log(f"- {file_name} 从上次的 {done}/{size} 字节继续分段下载")
+            stats['resumedFrom'] = done
+        else:
+            step = -(-size // self.segments)
+            segments = [[start, min(start + step, size) - 1, 0] for start in range(0, size, step)]
+            with open(part_path, 'wb') as f:
+                f.truncate(size)
+        meta = {'url': url, 'etag': info['etag'], 'size': size, 'segments': segments}
+        self.write_part_meta(meta_path, meta)
+        stats['segments'] = len(segments)
+
+        meta_lock = threading.Lock()
+        fd = os.open(part_path, os.O_WRONLY)
+        try:
+            with ThreadPoolExecutor(max_workers=len(segments)) as executor:
+                results = list(executor.map(
+                    lambda segment: self.download_segment(info['url'], fd, segment, meta,
+                                                          meta_path, meta_lock, stats),
+                    segments))
+        finally:
+            os.close(fd)
+            with meta_lock:
+                self.write_part_meta(meta_path, meta)
+            stats['bytes'] = sum(segment[2] for segment in segments) - stats['resumedFrom']
+        if not all(results):
+            raise requests.exceptions.RequestException(
+                f"{results.count(False)} 个分段下载不完整，已保留进度")
+        return size
+
+    def download_file(self, file_name, save_path, url, size=None, digest=None):
+        # 下载并保存文件：先写入隐藏目录 .download 中的 .part 文件（中断后下次从断点继续），
+        # 校验大小与摘要后再原子替换正式文件，更新期间旧版本始终可以访问
+        temp_path = save_path / '.download'
+        temp_path.mkdir(parents=True, exist_ok=True)
+        part_path = temp_path / f"{file_name}.part"
+        meta_path = temp_path / f"{file_name}.part.json"
+        self.log(f"- 开始下载 {file_name}...")
+        # 该文件的下载记录：请求数、首字节时间、本次传输的字节数、断点续传的起点与分段数
+        stats = {'name': file_name, 'ok': False, 'requests': 0, 'ttfbMs': None, 'bytes': 0,
+                 'resumedFrom': 0, 'segments': 1}
+        started = time.perf_counter()
+        try:
+            meta = self.read_part_meta(meta_path, url)
+            info = None
+            # 发布清单中的大小已表明不会分段时，不必再探测
+            if self.segments > 1 and (size is None or size >= self.segment_min_size):
+                info = self.probe_file(url, stats)
+            if info and info['ranges'] and info['size'] >= self.segment_min_size:
+                received = self.download_segments(file_name, url, info, part_path, meta_path, meta,
+                                                  stats)
+            else:
+                received = self.download_single(file_name, url, part_path, meta_path, meta, stats)
+
+            actual = part_path.stat().st_size
+            if received is not None and actual != received:
+                self.log(f"- {file_name} 大小不符 (应为 {received}，实际 {actual})，保留进度下次继续")
+                return False
+            # 与发布清单不一致的文件不能替换上线，丢弃后下次重新下载
+            mismatch = size is not None and actual != size
+            if not mismatch and digest and digest.startswith('sha256:'):
+                mismatch = self.file_digest(part_path) != digest
+            if mismatch:
+                self.log(f"- {file_name} 与发布清单中的大小或摘要不符，已丢弃")
+                part_path.unlink(missing_ok=True)
+                meta_path.unlink(missing_ok=True)
+                return False
+            os.replace(part_path, save_path / file_name)
+            meta_path.unlink(missing_ok=True)
+            self.log(f"- {file_name} 下载并保存成功.")
+            stats['ok'] = True
             return True
         except requests.exceptions.HTTPError as e:
-            print(f"- {file_name} 下载失败，地址: {url}")
+            self.log(f"- {file_name} 下载失败，地址: {url}")
             if e.response.status_code == 404:
-                print(f"- 错误：地址不存在 (404)，跳过...")
+                self.log(f"- 错误：地址不存在 (404)，跳过...")
             else:
-                print(f"- 下载 {file_name} 时发生错误: {e}")
+                self.log(f"- 下载 {file_name} 时发生错误: {e}")
         except requests.exceptions.RequestException as e:
-            print(f"- 下载 {file_name} 时发生请求错误: {e}, 地址: {url}")
+            self.log(f"- 下载 {file_name} 时发生请求错误: {e}, 地址: {url}")
+        except OSError as e:
+            self.log(f"- 保存 {file_name} 时发生错误: {e}")
+        finally:
+            seconds = time.perf_counter() - started
+            stats['seconds'] = round(seconds, 3)
+            stats['bytesPerSec'] = round(stats['bytes'] / seconds) if seconds else 0
+            with self.lock:
+                self.metrics['assets'].append(stats)
         return False
 
-    def get_soft(self, task):
-        # 处理每个软件的更新
-        save_path = Path(task['savePath'])
-        print(f"====== 开始更新 {task['name']} ======")
-        
-        # 获取版本号
-        if task['tagMethod'] == 'github_pre_release':
-            tag_name = self.get_latest_pre_release_tag_name(task['gitRepo'])
-        else:
-            tag_name = self.get_latest_release_tag_name(task['gitRepo'])
+    def link_file(self, source, target):
+        # 在 target 生成与 source 内容相同的文件，返回所用方式：
+        # 硬链接不占额外空间；reflink 共享数据块但各自独立（需 btrfs/XFS 等支持）；跨文件系统时只能复制
+        if self.mirror_mode in ('auto', 'link'):
+            try:
+                os.link(source, target)
+                return '硬链接'
+            except OSError:
+                if self.mirror_mode == 'link':
+                    raise
+        if self.mirror_mode in ('auto', 'reflink'):
+            try:
+                with open(source, 'rb') as src, open(target, 'wb') as dst:
+                    fcntl.ioctl(dst.fileno(), 0x40049409, src.fileno())  # FICLONE
+                shutil.copystat(source, target)
+                return 'reflink'
+            except OSError:
+                target.unlink(missing_ok=True)
+                if self.mirror_mode == 'reflink':
+                    raise
+        shutil.copy2(source, target)
+        return '复制'
 
-        # 检查是否需要更新
-        if self.version.get(task['name']) == tag_name:
-            print(f"- {task['name']} 已是最新版本，跳过.")
-            print(f"====== 结束 {task['name']} ======")
+    def publish(self, save_path, file_name):
+        # 将文件发布到各镜像目录（保持相对 base_path 的路径）；先生成临时文件再原子替换，
+        # 镜像中已是同一文件（硬链接）或大小与修改时间一致时跳过
+        source = save_path / file_name
+        if not self.mirrors or not source.is_file():
             return
+        try:
+            relative = save_path.relative_to(self.base_path)
+        except ValueError:
+            relative = Path()
+        stat = source.stat()
+        for mirror in self.mirrors:
+            target_path = mirror / relative
+            target = target_path / file_name
+            try:
+                if target.exists():
+                    current = target.stat()
+                    if os.path.samestat(stat, current) or (
+                            current.st_size == stat.st_size and current.st_mtime_ns == stat.st_mtime_ns):
+                        continue
+                target_path.mkdir(parents=True, exist_ok=True)
+                temp_path = target_path / f".{file_name}.tmp"
+                temp_path.unlink(missing_ok=True)
+                method = self.link_file(source, temp_path)
+                os.replace(temp_path, target)
+                self.log(f"- {file_name} 已发布到 {target_path}（{method}）")
+            except OSError as e:
+                self.log(f"- 发布 {file_name} 到 {mirror} 时发生错误: {e}")
 
-        print(f"- 发现新版本 {tag_name} (本地版本: {self.version.get(task['name'], '未知')})")
-        self.version[task['name']] = tag_name
+    def get_release(self, task):
+        # 获取版本号与资源清单，失败时返回 None
+        if task['tagMethod'] == 'github_pre_release':
+            return self.get_latest_pre_release(task['gitRepo'])
+        return self.get_latest_release(task['gitRepo'])
+
+    def check_update(self, task, release):
+        # 检查是否需要更新，返回待下载的文件列表 [(文件名, 保存目录, 下载地址, 预期大小与摘要)]
+        # 资源清单中大小与摘要都和本地文件一致的不再下载
+        name = task['name']
+        tag_name = release['tagName'] if release else ''
+        if not tag_name:
+            self.log(f"- {name} 获取版本号失败，跳过.")
+            self.summary[name] = {'tag': '', 'status': '获取版本号失败'}
+            return []
+        if self.version.get(name) == tag_name:
+            self.log(f"- {name} 已是最新版本 {tag_name}，跳过.")
+            self.summary[name] = {'tag': tag_name, 'status': '已是最新'}
+            for download in task['downloads']:
+                file_name = download['saveName'] or download['sourceName'].replace('{{tagName}}', tag_name)
+                self.publish(Path(task['savePath']), file_name)
+            return []
+
+        self.log(f"- {name} 发现新版本 {tag_name} (本地版本: {self.version.get(name, '未知')})")
+        summary = self.summary[name] = {'tag': tag_name, 'status': '更新', 'ok': [], 'failed': [],
+                                        'skipped': []}
 
-        # 根据 v 参数决定是否添加前缀 'v'
+        # 根据 v 参数决定是否添加前缀 'v'（仅在发布没有资源清单时用于拼接下载地址）
         add_v_prefix = task.get('v', 'no') == 'yes'
         download_tag = f"v{tag_name}" if add_v_prefix and not tag_name.startswith('v') else tag_name
 
-        # 下载每个文件
+        state = self.asset_state(task)
+        jobs = []
         for download in task['downloads']:
             source_name = download['sourceName'].replace('{{tagName}}', tag_name)
             file_name = download['saveName'] or source_name
-            download_url = f"https://github.com/{task['gitRepo']}/releases/download/{download_tag}/{source_name}"
-            
-            # 删除旧版本文件并下载新版本
-            file_path = save_path / file_name
-            if file_path.exists():
-                file_path.unlink()  # 删除旧文件
-                print(f"- 已删除旧版本 {file_name}.")
-            
-            if self.download_file(file_name, save_path, download_url):
-                self.set_local_versions()  # 更新本地版本文件
-    
-        print(f"====== {task['name']} 更新完成 ======")
+            save_path = Path(task['savePath'])
+            # 上次已完整下载该版本的文件（如上次部分失败）不再重复下载
+            if state.get(file_name, {}).get('tag') == tag_name and (save_path / file_name).is_file():
+                summary['skipped'].append(file_name)
+                self.publish(save_path, file_name)
+                continue
+            if not release['assets']:
+                download_url = f"{self.github_url}/{task['gitRepo']}/releases/download/{download_tag}/{source_name}"
+                jobs.append((file_name, save_path, download_url, {}))
+                continue
+
+            asset = release['assets'].get(source_name)
+            if asset is None:
+                self.log(f"- {name} {tag_name} 的发布中没有 {source_name}，跳过...")
+                summary['failed'].append(file_name)
+            elif self.is_same_file(save_path / file_name, asset):
+                self.log(f"- {file_name} 与发布中的文件一致，无需下载.")
+                summary['skipped'].append(file_name)
+                self.record_asset(task, tag_name, file_name, asset)
+                self.publish(save_path, file_name)
+            else:
+                jobs.append((file_name, save_path, asset['url'], asset))
+
+        # 所有文件都已是该版本时记为最新
+        if not jobs and not summary['failed']:
+            with self.lock:
+                self.version[name] = tag_name
+                self.dirty = True
+        elif summary['skipped']:
+            self.log(f"- {name} 只需下载其余 {len(jobs)} 个文件")
+        return jobs
+
+    def get_file(self, task, tag_name, file_name, save_path, url, asset):
+        # 下载新版本（完成后才替换旧文件），成功后记录该文件的版本（批量写入版本文件）
+        ok = self.download_file(file_name, save_path, url, size=asset.get('size'),
+                                digest=asset.get('digest'))
+        with self.lock:
+            self.summary[task['name']]['ok' if ok else 'failed'].append(file_name)
+        if ok:
+            self.publish(save_path, file_name)
+            self.record_asset(task, tag_name, file_name, asset)
+            self.flush_versions()
+        return ok
+
+    def get_soft(self, task):
+        # 处理每个软件的更新
+        self.log(f"====== 开始更新 {task['name']} ======")
+        release = self.get_release(task)
+        for job in self.check_update(task, release):
+            self.get_file(task, release['tagName'], *job)
+        self.flush_versions(force=True)
+        self.log(f"====== {task['name']} 处理完成 ======")
+
+    def run_concurrent(self):
+        # 并发执行：先并行获取所有版本号，再由有界线程池下载全部文件
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            releases = list(executor.map(self.get_release, self.softs))
+            jobs = []
+            for task, release in zip(self.softs, releases):
+                jobs += [(task, release['tagName']) + job for job in self.check_update(task, release)]
+            self.log(f"====== 共 {len(jobs)} 个文件需要下载，并发数 {self.max_workers} ======")
+            list(executor.map(lambda job: self.get_file(*job), jobs))
+
+    def describe_result(self, result):
+        # 单个软件本次检查结果的一行描述
+        if result['status'] != '更新':
+            return f"{result['status']} {result['tag']}".rstrip()
+        total = len(result['ok']) + len(result['failed'])
+        line = f"更新到 {result['tag']}，成功 {len(result['ok'])}/{total} 个文件"
+        if result['skipped']:
+            line += f"，{len(result['skipped'])} 个文件未变化"
+        if result['failed']:
+            line += f"，失败: {', '.join(result['failed'])}"
+        return line
+
+    def print_summary(self):
+        # 输出本次运行的汇总
+        print("====== 更新汇总 ======")
+        for task in self.softs:
+            result = self.summary.get(task['name'])
+            if result is not None:
+                print(f"- {task['name']}: {self.describe_result(result)}")
+
+    def percentile(self, values, q):
+        # 简单分位数（最近秩），没有数据时为 None
+        if not values:
+            return None
+        values = sorted(values)
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    def metrics_report(self):
+        # 汇总指标：API 请求（含 304 缓存命中）、下载吞吐、连接复用与每个文件的明细
+        records = self.metrics['requests']
+        assets = self.metrics['assets']
+        seconds = time.time() - self.metrics['startedAt']
+        api_ttfb = [r['ttfbMs'] for r in records if r['kind'] == 'api']
+        download_ttfb = [r['ttfbMs'] for r in records if r['kind'] != 'api']
+        transferred = sum(asset['bytes'] for asset in assets)
+        # 每个主机连接池中创建过的连接数（断开后重连不重复计算）与累计请求数，用于判断连接复用
+        pools = self.adapter.poolmanager.pools
+        connections = {}
+        for key in pools.keys():
+            pool = pools[key]
+            connections[f"{key.key_scheme}://{key.key_host}:{key.key_port}"] = {
+                'connections': pool.num_connections, 'requests': pool.num_requests}
+        return {
+            'startedAt': self.format_time(self.metrics['startedAt']),
+            'seconds': round(seconds, 3),
+            'api': {
+                'requests': len(api_ttfb),
+                'notModified': sum(1 for r in records if r['kind'] == 'api' and r['status'] == 304),
+                'ttfbP50Ms': self.percentile(api_ttfb, 0.5),
+                'ttfbP99Ms': self.percentile(api_ttfb, 0.99),
+            },
+            'downloads': {
+                'files': len(assets),
+                'ok': sum(1 for asset in assets if asset['ok']),
+                'resumed': sum(1 for asset in assets if asset['resumedFrom']),
+                'unchanged': sum(len(result.get('skipped', [])) for result in self.summary.values()),
+                'requests': len(download_ttfb),
+                'bytes': transferred,
+                'bytesPerSec': round(transferred / seconds) if seconds else 0,
+                'ttfbP50Ms': self.percentile(download_ttfb, 0.5),
+                'ttfbP99Ms': self.percentile(download_ttfb, 0.99),
+            },
+            'connections': connections,
+            'softs': {name: self.describe_result(result) for name, result in self.summary.items()},
+            'assets': assets,
+            'requests': records,
+        }
+
+    def write_metrics(self):
+        # 写入指标报告（先写临时文件再替换），并开始新的记录
+        report = self.metrics_report()
+        if self.metrics_path is None:
+            self.metrics_path = self.version_file_path.with_name('ClientDownloadMetrics.json')
+        temp_path = self.metrics_path.with_name(self.metrics_path.name + '.tmp')
+        temp_path.write_text(json.dumps(report, ensure_ascii=False, indent=2))
+        os.replace(temp_path, self.metrics_path)
+        self.metrics = self.new_metrics()
+        return report
 
     def run(self):
         # 执行更新过程
-        for soft in self.softs:
-            self.get_soft(soft)
+        self.summary = {}
+        self.metrics = self.new_metrics()
+        if self.max_workers > 1:
+            self.run_concurrent()
+        else:
+            for soft in self.softs:
+                self.get_soft(soft)
+        self.set_local_versions()  # 保存API请求缓存
+        self.print_summary()
+        report = self.write_metrics()
+        print(f"- 下载 {report['downloads']['bytes']} 字节，{report['downloads']['bytesPerSec']} 字节/秒，"
+              f"API 请求 {report['api']['requests']} 次（未变化 {report['api']['notModified']} 次），"
+              f"指标已写入 {self.metrics_path}")
+
+    def write_status(self, status):
+        # 写入状态文件（先写临时文件再替换）
+        content = {
+            'updatedAt': datetime.now().isoformat(timespec='seconds'),
+            'rateLimitedUntil': self.format_time(self.rate_limited_until),
+            'softs': {
+                name: dict(entry, lastCheck=self.format_time(entry['lastCheck']),
+                           nextCheck=self.format_time(entry['nextCheck']))
+                for name, entry in status.items()
+            }
+        }
+        temp_path = self.status_path.with_name(self.status_path.name + '.tmp')
+        try:
+            temp_path.write_text(json.dumps(content, ensure_ascii=False, indent=2))
+            os.replace(temp_path, self.status_path)
+        except OSError as e:
+            # 状态文件写不进去（如磁盘已满）不影响常驻模式继续运行
+            self.log(f"- 写入状态文件失败: {e}")
+
+    def format_time(self, timestamp):
+        return datetime.fromtimestamp(timestamp).isoformat(timespec='seconds') if timestamp else None
+
+    def run_daemon(self, interval=3600, jitter=0.1, retry_delay=300, status_path=None):
+        # 常驻模式：会话与版本信息保留在内存中，每个软件按各自的间隔（softs 中可用 interval 覆盖）
+        # 加随机抖动检查更新；出错时指数退避，触发 API 速率限制时等到限制解除后再检查
+        self.status_path = Path(status_path) if status_path else \
+            self.version_file_path.with_name('ClientDownloadStatus.json')
+        if not self.softs:
+            self.log("- 没有需要检查的软件，常驻模式退出")
+            raise SystemExit(1)
+        stop = threading.Event()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, lambda *args: stop.set())
+
+        # 启动时把首次检查错开，避免同时请求
+        now = time.time()
+        status = {
+            task['name']: {
+                'version': self.version.get(task['name'], ''),
+                'lastCheck': None,
+                'lastResult': '',
+                'nextCheck': now + random.uniform(0, min(60, interval * jitter)),
+                'failures': 0
+            }
+            for task in self.softs
+        }
+        self.log(f"====== 常驻模式启动，检查间隔 {interval} 秒，状态文件: {self.status_path} ======")
+
+        while not stop.is_set():
+            task = min(self.softs, key=lambda task: status[task['name']]['nextCheck'])
+            entry = status[task['name']]
+            delay = entry['nextCheck'] - time.time()
+            if delay > 0:
+                self.write_status(status)
+                stop.wait(delay)
+                continue
+
+            self.summary.pop(task['name'], None)
+            self.metrics = self.new_metrics()
+            error = None
+            try:
+                self.get_soft(task)
+                self.set_local_versions()
+                self.write_metrics()  # 最近一次检查的指标
+            except Exception as e:
+                # 意外错误（如磁盘已满）按失败退避，不退出常驻进程
+                error = e
+                self.log(f"- {task['name']} 检查出错: {e}")
+            result = self.summary.get(task['name'])
+            ok = error is None and result is not None and \
+                result['status'] != '获取版本号失败' and not result.get('failed')
+
+            now = time.time()
+            task_interval = task.get('interval', interval)
+            entry['lastCheck'] = now
+            if error is not None:
+                entry['lastResult'] = f'检查出错: {error}'
+            else:
+                entry['lastResult'] = self.describe_result(result) if result else '检查失败'
+            entry['version'] = self.version.get(task['name'], '')
+            if ok:
+                entry['failures'] = 0
+                entry['nextCheck'] = now + task_interval * random.uniform(1 - jitter, 1 + jitter)
+            else:
+                entry['failures'] += 1
+                backoff = min(task_interval, retry_delay * 2 ** (entry['failures'] - 1))
+                entry['nextCheck'] = now + backoff * random.uniform(1, 1 + jitter)
+
+            # 速率限制未解除前，所有软件都推迟检查
+            if self.rate_limited_until > now:
+                self.log(f"- GitHub API 速率限制，{self.format_time(self.rate_limited_until)} 后再检查")
+                for other in status.values():
+                    other['nextCheck'] = max(other['nextCheck'],
+                                             self.rate_limited_until + random.uniform(0, 30))
+            self.write_status(status)
+
+        self.write_status(status)
+        self.log("====== 常驻模式已退出 ======")
 
 # 使用示例
 if __name__ == "__main__":
-    downloader = ClientDownload()
-    downloader.run()
+    parser = argparse.ArgumentParser(description='从 GitHub Releases 同步客户端安装包')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='并发数，大于1时并行获取版本号并下载文件（默认1，逐个处理）')
+    parser.add_argument('--per-host', type=int, default=4,
+                        help='每个主机的最大连接数（默认4）')
+    parser.add_argument('--segments', type=int, default=1,
+                        help='大文件分段并行下载的连接数（默认1，不分段）')
+    parser.add_argument('--segment-min-size', type=int, default=32,
+                        help='超过多少MB的文件才分段下载（默认32）')
+    parser.add_argument('--daemon', action='store_true',
+                        help='常驻模式，按间隔持续检查更新')
+    parser.add_argument('--interval', type=int, default=3600,
+                        help='常驻模式下每个软件的检查间隔秒数（默认3600）')
+    parser.add_argument('--jitter', type=float, default=0.1,
+                        help='检查间隔的随机抖动比例（默认0.1）')
+    parser.add_argument('--retry-delay', type=int, default=300,
+                        help='出错后首次重试的等待秒数，之后逐次翻倍（默认300）')
+    parser.add_argument('--status-file',
+                        help='常驻模式的状态文件（默认与版本文件同目录的 ClientDownloadStatus.json）')
+    parser.add_argument('--metrics-file',
+                        help='指标报告文件（默认与版本文件同目录的 ClientDownloadMetrics.json）')
+    parser.add_argument('--catalogue',
+                        help='软件清单文件（JSON，格式同内置清单，savePath 为相对下载目录的路径；默认使用内置清单）')
+    parser.add_argument('--only', action='append',
+                        help='只更新指定的软件，可多次指定或用逗号分隔，如 --only ClashVerge,FlClash')
+    parser.add_argument('--mirror', action='append',
+                        help='镜像目录，下载完成的文件同时发布到该目录，可多次指定')
+    parser.add_argument('--mirror-mode', choices=['auto', 'link', 'reflink', 'copy'], default='auto',
+                        help='发布到镜像的方式（默认auto：硬链接，失败时 reflink，再失败时复制）')
+    parser.add_argument('--dump-catalogue',
+                        help='将内置清单写入该文件后退出，可作为清单文件的模板')
+    args = parser.parse_args()
+    only = [name.strip() for item in args.only or [] for name in item.split(',') if name.strip()]
+    if args.dump_catalogue:
+        Path(args.dump_catalogue).write_text(
+            json.dumps(ClientDownload.default_softs(), ensure_ascii=False, indent=4), encoding='utf-8')
+        raise SystemExit(0)
+    downloader = ClientDownload(max_workers=args.workers, per_host=args.per_host,
+                                segments=args.segments,
+                                segment_min_size=args.segment_min_size * 1024 * 1024,
+                                catalogue=args.catalogue, only=only, mirrors=args.mirror,
+                                mirror_mode=args.mirror_mode)
+    if args.metrics_file:
+        downloader.metrics_path = Path(args.metrics_file)
+    if args.daemon:
+        downloader.run_daemon(interval=args.interval, jitter=args.jitter,
+                              retry_delay=args.retry_delay, status_path=args.status_file)
+    else:
+        downloader.run()
@@ -0,0 +1,90 @@
+import importlib.util
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import time
+
+def load_module(path: str):
+    """按路径加载被测脚本（文件名含空格，不能直接import）"""
+    name = os.path.splitext(os.path.basename(path))[0].replace(' ', '_')
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def start_server(serve, args: tuple, name: str, timeout: float = 10):
+    """在独立进程中运行假服务 serve(*args, ready)，避免占用被测进程的GIL与内存
+
+    等到服务调用 ready.set() 后返回进程对象，timeout 秒内未就绪时抛出 RuntimeError
+    """
+    ready = multiprocessing.Event()
+    proc = multiprocessing.Process(target=serve, args=(*args, ready), daemon=True)
+    proc.start()
+    if not ready.wait(timeout):
+        proc.terminate()
+        raise RuntimeError(f'{name}启动失败')
+    return proc
+
+def git_revision(script: str) -> str:
+    """被测脚本所在仓库的当前提交（脚本有未提交的修改时加 -dirty）"""
+    cwd = os.path.dirname(script)
+    try:
+        rev = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=cwd,
+                             capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--', script], cwd=cwd,
+                               capture_output=True, text=True).stdout.strip()
+        return rev + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def median_run(runs: list, key: str) -> dict:
+    """按 key 排序取中位数的那次运行"""
+    return sorted(runs, key=lambda run: run[key])[len(runs) // 2]
+
+def build_record(script: str, args, scenario_keys: tuple, result: dict) -> dict:
+    """结果记录：提交、日期、Python版本、场景参数、测量结果与峰值内存"""
+    return {
+        'revision': git_revision(script),
+        'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        # 场景相同的结果之间才有可比性
+        'scenario': {key: getattr(args, key) for key in scenario_keys},
+        **result,
+        # Linux上 ru_maxrss 单位为KB
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+def compare(record: dict, path: str, keys: tuple):
+    """与结果文件中同场景的最近一次记录比较 keys 中的各项"""
+    previous = None
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            if entry['scenario'] == record['scenario']:
+                previous = entry
+    if previous is None:
+        print(f"{path} 中没有相同场景的记录")
+        return
+    print(f"对比 {previous['revision']} ({previous['date']}):")
+    width = max(len(key) for key in keys)
+    for key in keys:
+        old, new = previous.get(key), record.get(key)
+        if old is None or new is None:
+            print(f"  {key:<{width}} {old!s:>10} -> {new!s:<10}")
+            continue
+        change = (new - old) / old * 100 if old else 0
+        print(f"  {key:<{width}} {old:>10} -> {new:<10} ({change:+.1f}%)")
+
+def finish(record: dict, args, keys: tuple):
+    """按 --compare 与历史记录比较，按 --output 追加写入结果"""
+    if args.compare and os.path.exists(args.compare):
+        compare(record, args.compare, keys)
+    if args.output:
+        with open(args.output, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
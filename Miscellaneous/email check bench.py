@@ -0,0 +1,311 @@
+import argparse
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+import dns.message
+import dns.rcode
+import dns.rrset
+import numpy as np
+import pandas as pd
+
+from bench_common import build_record, finish, load_module, median_run, start_server
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'email check.py')
+
+# 各类域名的MX主机地址（127.0.0.0/8 都指向本机），refuse 对应的地址上没有监听
+PROFILE_HOSTS = {
+    'fast': '127.0.0.2',     # 正常响应
+    'slow': '127.0.0.3',     # 每条响应延迟 --slow-latency 秒
+    'refuse': '127.0.0.4',   # 连接被拒绝
+    'timeout': '127.0.0.5',  # 接受连接但不发送欢迎语，等待验证器超时
+}
+# DNS侧的故障：域名不存在 / 没有MX记录
+DNS_PROFILES = ('nxdomain', 'nomx')
+
+def parse_mix(text: str) -> dict:
+    """解析域名类型占比，如 fast=0.8,slow=0.1,refuse=0.05,timeout=0.05"""
+    mix = {}
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in PROFILE_HOSTS and name not in DNS_PROFILES:
+            raise ValueError(f"未知的域名类型: {name}")
+        mix[name] = float(weight)
+    total = sum(mix.values())
+    return {name: weight / total for name, weight in mix.items()}
+
+
+class FakeDNS(asyncio.DatagramProtocol):
+    """只应答MX查询的本地DNS，域名形如 d12.fast.bench，第二段决定应答内容"""
+
+    def __init__(self, latency: float, ttl: int = 300):
+        self.latency = latency
+        self.ttl = ttl
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        try:
+            query = dns.message.from_wire(data)
+        except Exception:
+            return
+        response = dns.message.make_response(query)
+        qname = query.question[0].name
+        labels = qname.to_text().split('.')
+        profile = labels[1] if len(labels) > 2 else ''
+        if profile in PROFILE_HOSTS:
+            response.answer.append(dns.rrset.from_text(
+                qname, self.ttl, 'IN', 'MX', f"10 {PROFILE_HOSTS[profile]}."))
+        elif profile != 'nomx':
+            response.set_rcode(dns.rcode.NXDOMAIN)
+
+        wire = response.to_wire()
+        if self.latency > 0:
+            asyncio.get_running_loop().call_later(self.latency, self.transport.sendto, wire, addr)
+        else:
+            self.transport.sendto(wire, addr)
+
+
+class FakeSMTP:
+    """最小的SMTP应答：支持EHLO/HELO、MAIL、RCPT、RSET、NOOP、QUIT
+
+    收件人本地部分以 nouser 开头时RCPT返回550，其余返回250。
+    """
+
+    def __init__(self, latency: float = 0, tarpit: bool = False):
+        self.latency = latency
+        self.tarpit = tarpit
+
+    async def reply(self, writer, text: str):
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+        writer.write(text.encode() + b'\r\n')
+        await writer.drain()
+
+    async def handle(self, reader, writer):
+        try:
+            if self.tarpit:
+                # 不发送欢迎语，直到对方断开
+                while await reader.read(1024):
+                    pass
+                return
+            await self.reply(writer, '220 bench.local ESMTP')
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode(errors='ignore').strip()
+                verb = command[:4].upper()
+                if verb in ('EHLO', 'HELO'):
+                    await self.reply(writer, '250-bench.local\r\n250 8BITMIME')
+                elif verb == 'RCPT':
+                    address = command.partition(':')[2].strip().strip('<>')
+                    if address.lower().startswith('nouser'):
+                        await self.reply(writer, '550 5.1.1 User unknown')
+                    else:
+                        await self.reply(writer, '250 2.1.5 OK')
+                elif verb == 'QUIT':
+                    await self.reply(writer, '221 Bye')
+                    break
+                else:
+                    await self.reply(writer, '250 OK')
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+def serve(args, ready):
+    """假DNS与SMTP服务的进程入口，全部开始监听后设置 ready"""
+    async def run():
+        loop = asyncio.get_running_loop()
+        await loop.create_datagram_endpoint(lambda: FakeDNS(args.dns_latency),
+                                            local_addr=('127.0.0.1', args.dns_port))
+        if args.dns_race:
+            # 竞速模式下多一个慢上游，与正常上游同时查询
+            await loop.create_datagram_endpoint(lambda: FakeDNS(args.slow_dns_latency),
+                                                local_addr=('127.0.0.1', args.dns_port + 1))
+        servers = {
+            'fast': FakeSMTP(args.smtp_latency),
+            'slow': FakeSMTP(args.slow_latency),
+            'timeout': FakeSMTP(tarpit=True),
+        }
+        for name, server in servers.items():
+            await asyncio.start_server(server.handle, PROFILE_HOSTS[name], args.smtp_port,
+                                       backlog=4096)
+        ready.set()
+        await asyncio.Event().wait()
+    asyncio.run(run())
+
+
+def generate_csv(path: str, args):
+    """生成测试CSV：域名按Zipf分布（少数域名占大多数邮箱），混入已知域名与格式错误的邮箱"""
+    rng = np.random.default_rng(args.seed)
+    mix = parse_mix(args.mix)
+
+    # 每个排名的域名随机分配一种类型，排名越靠前出现越频繁
+    profiles = rng.choice(list(mix), size=args.domains, p=list(mix.values()))
+    domains = np.array([f"d{rank}.{profile}.bench" for rank, profile in enumerate(profiles)])
+    weights = 1.0 / np.arange(1, args.domains + 1) ** args.zipf
+    picked = domains[rng.choice(args.domains, size=args.rows, p=weights / weights.sum())]
+
+    known = np.array(['gmail.com', 'qq.com', '163.com', 'outlook.com'])
+    roll = rng.random(args.rows)
+    picked = np.where(roll < args.known_rate, known[rng.integers(0, len(known), args.rows)], picked)
+
+    users = np.where(rng.random(args.rows) < args.unknown_rate, 'nouser', 'user')
+    emails = pd.Series(users).str.cat(pd.Series(np.arange(args.rows).astype(str))) + '@' + picked
+    invalid = rng.random(args.rows) < args.invalid_rate
+    emails[invalid] = emails[invalid].str.replace('@', '#', regex=False)
+
+    pd.DataFrame({'email': emails}).to_csv(path, index=False)
+
+def build_validator(module, args):
+    """按参数创建验证器，并指向本地假服务"""
+    options = {
+        'timeout': args.timeout,
+        'smtp_race': args.smtp_race,
+        'rcpt_probe': args.rcpt_probe,
+    }
+    if args.smtp_pool or args.rcpt_probe:
+        options['smtp_pool'] = module.SMTPPool()
+    if args.dns_race:
+        upstreams = [f"127.0.0.1#{args.dns_port + 1}", f"127.0.0.1#{args.dns_port}"]
+        options['resolver_pool'] = module.ResolverPool(nameservers=upstreams, lifetime=args.timeout,
+                                                       attempt_timeout=min(1.5, args.timeout))
+    if args.engine == 'async':
+        validator = module.AsyncEmailValidator(concurrency=args.concurrency,
+                                               per_host=args.per_host, **options)
+        resolvers = [validator.resolver, validator.async_resolver]
+    else:
+        validator = module.EmailValidator(**options)
+        resolvers = [validator.resolver]
+    for res in resolvers:
+        res.nameservers = ['127.0.0.1']
+        res.port = args.dns_port
+    validator.smtp_ports = [args.smtp_port]
+    return validator
+
+def run_once(module, args, source: str, workdir: str) -> dict:
+    """在CSV副本上运行一次 process_file，返回吞吐与延迟"""
+    path = os.path.join(workdir, 'run.csv')
+    shutil.copyfile(source, path)
+    validator = build_validator(module, args)
+    start = time.perf_counter()
+    try:
+        module.process_file(path, max_workers=args.workers, validator=validator,
+                            stream=args.stream, chunk_size=args.chunk_size, resume=False)
+    finally:
+        validator.close()
+    elapsed = time.perf_counter() - start
+
+    # 延迟只统计经过网络验证的行（预筛选的行耗时为0）
+    results = pd.read_csv(path, usecols=['email', 'smtp_valid', 'validation_time_ms', 'validation_type'])
+    latency = results.loc[results['validation_type'] == '完整验证', 'validation_time_ms']
+    # 正确性检查：fast 主机始终可达，判为SMTP不可达的行说明结果有误（如多批次之间共享了状态）
+    fast = results['email'].str.contains('@', regex=False) & \
+        results['email'].str.endswith('.fast.bench')
+    wrong = int((fast & ~results['smtp_valid'].astype(bool)).sum())
+    return {
+        'wrong_fast': wrong,
+        'seconds': round(elapsed, 3),
+        'emails_per_sec': round(args.rows / elapsed, 1),
+        'p50_ms': round(float(latency.quantile(0.5)), 1),
+        'p99_ms': round(float(latency.quantile(0.99)), 1),
+        # 各阶段耗时摘要（不含直方图桶）
+        'stages': {stage: {key: value for key, value in summary.items() if key != 'buckets'}
+                   for stage, summary in validator.metrics.snapshot(args.rows)['stages'].items()},
+    }
+
+SCENARIO_KEYS = ('rows', 'domains', 'zipf', 'mix', 'known_rate', 'invalid_rate', 'unknown_rate',
+                 'seed', 'dns_latency', 'smtp_latency', 'slow_latency', 'timeout', 'engine',
+                 'workers', 'concurrency', 'per_host', 'smtp_race', 'smtp_pool', 'rcpt_probe',
+                 'stream', 'chunk_size', 'dns_race', 'slow_dns_latency')
+
+COMPARE_KEYS = ('emails_per_sec', 'p50_ms', 'p99_ms', 'peak_rss_mb')
+
+def main():
+    parser = argparse.ArgumentParser(description='离线基准测试：本地假DNS/SMTP服务上测量 process_file 的吞吐与延迟')
+    parser.add_argument('--rows', type=int, default=20000, help='邮箱数（默认20000）')
+    parser.add_argument('--domains', type=int, default=2000, help='不同域名数（默认2000）')
+    parser.add_argument('--zipf', type=float, default=1.1, help='域名分布的Zipf指数，越大越集中（默认1.1）')
+    parser.add_argument('--mix', default='fast=0.8,slow=0.08,refuse=0.04,timeout=0.02,nxdomain=0.04,nomx=0.02',
+                        help='域名类型占比：fast/slow/refuse/timeout/nxdomain/nomx')
+    parser.add_argument('--known-rate', type=float, default=0.3, help='已知域名邮箱占比（默认0.3）')
+    parser.add_argument('--invalid-rate', type=float, default=0.02, help='格式错误邮箱占比（默认0.02）')
+    parser.add_argument('--unknown-rate', type=float, default=0.05,
+                        help='不存在的邮箱占比，RCPT探测时返回550（默认0.05）')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子（默认42）')
+    parser.add_argument('--dns-latency', type=float, default=0.005, help='DNS应答延迟秒数（默认0.005）')
+    parser.add_argument('--smtp-latency', type=float, default=0.005, help='fast主机每条响应的延迟秒数')
+    parser.add_argument('--slow-latency', type=float, default=0.5, help='slow主机每条响应的延迟秒数')
+    parser.add_argument('--dns-port', type=int, default=5353, help='假DNS端口（默认5353）')
+    parser.add_argument('--smtp-port', type=int, default=2525, help='假SMTP端口（默认2525）')
+    parser.add_argument('--timeout', type=int, default=2, help='验证器超时秒数（默认2）')
+    parser.add_argument('--engine', choices=['thread', 'async'], default='thread')
+    parser.add_argument('--workers', type=int, default=10)
+    parser.add_argument('--concurrency', type=int, default=500)
+    parser.add_argument('--per-host', type=int, default=10)
+    parser.add_argument('--smtp-race', action='store_true')
+    parser.add_argument('--dns-race', action='store_true',
+                        help='使用 ResolverPool 同时查询正常上游与一个慢上游（端口 --dns-port+1）')
+    parser.add_argument('--slow-dns-latency', type=float, default=1.0,
+                        help='竞速模式下慢上游的应答延迟秒数（默认1.0）')
+    parser.add_argument('--smtp-pool', action='store_true')
+    parser.add_argument('--rcpt-probe', action='store_true')
+    parser.add_argument('--stream', action='store_true')
+    parser.add_argument('--chunk-size', type=int, default=50000,
+                        help='流式模式每块的行数；小于 --rows 时可检查多批次运行（默认50000）')
+    parser.add_argument('--repeat', type=int, default=3, help='重复次数，取吞吐的中位数那次（默认3）')
+    parser.add_argument('--log', action='store_true', help='保留被测脚本的逐条日志（默认关闭）')
+    parser.add_argument('--output', help='将结果追加写入该JSON lines文件')
+    parser.add_argument('--compare', help='与该JSON lines文件中同场景的最近记录比较')
+    args = parser.parse_args()
+
+    module = load_module(SCRIPT)
+    if not args.log:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    workdir = tempfile.mkdtemp(prefix='email-bench-')
+    servers = start_server(serve, (args,), '假DNS/SMTP服务')
+    try:
+        source = os.path.join(workdir, 'input.csv')
+        generate_csv(source, args)
+        runs = []
+        for i in range(args.repeat):
+            runs.append(run_once(module, args, source, workdir))
+            print(f"第{i + 1}次: {runs[-1]['emails_per_sec']} 封/秒, "
+                  f"p50 {runs[-1]['p50_ms']}ms, p99 {runs[-1]['p99_ms']}ms, {runs[-1]['seconds']}秒")
+            if runs[-1]['wrong_fast']:
+                print(f"警告: {runs[-1]['wrong_fast']} 个可达主机的邮箱被判为SMTP不可达")
+    finally:
+        servers.terminate()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    best = median_run(runs, 'emails_per_sec')
+    record = build_record(SCRIPT, args, SCENARIO_KEYS, {
+        'emails_per_sec': best['emails_per_sec'],
+        'p50_ms': best['p50_ms'],
+        'p99_ms': best['p99_ms'],
+        'wrong_fast': max(run['wrong_fast'] for run in runs),
+        'stages': best['stages'],
+    })
+
+    print(f"""
+{'='*60}
+基准测试结果 ({record['revision']}, {args.engine}, {args.rows} 封 / {args.domains} 个域名):
+- 吞吐: {record['emails_per_sec']} 封/秒（{args.repeat}次的中位数）
+- 延迟: p50 {record['p50_ms']}ms / p99 {record['p99_ms']}ms
+- 可达主机被误判: {record['wrong_fast']} 封
+- 峰值内存: {record['peak_rss_mb']} MB
+{'='*60}""")
+
+    finish(record, args, COMPARE_KEYS)
+
+if __name__ == "__main__":
+    main()
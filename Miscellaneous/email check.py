@@ -1,15 +1,40 @@
 import csv
+import json
+import os
 import re
-from dns import resolver
+import sqlite3
+import contextlib
+import enum
+import functools
+import importlib
+import math
+import argparse
+import asyncio
+from dns import resolver, asyncresolver
+import dns.asyncbackend
+import dns.asyncquery
+import dns.exception
+import dns.flags
+import dns.message
+import dns.name
+import dns.query
+import dns.rcode
+import dns.rdataclass
+import dns.rdatatype
 import socket
 import smtplib
 import ssl
 import logging
 import time
-import pandas as pd
 import sys
+import queue
+import selectors
+import subprocess
+import threading
+import zlib
 from datetime import datetime
 import concurrent.futures
+import heapq
 
 # 配置日志
 logging.basicConfig(
@@ -18,10 +43,1103 @@ logging.basicConfig(
     datefmt='%Y-%m-%d %H:%M:%S'
 )
 
+class LazyModule:
+    """首次访问属性时才导入模块（管道模式用不到pandas，可省去其导入耗时）"""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+pd = LazyModule('pandas')
+
+def is_missing(value) -> bool:
+    """是否为空值（None或NaN，如CSV中的空单元格）"""
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+class Status(enum.IntEnum):
+    """邮箱结论"""
+    INVALID = 0
+    VALID = 1
+
+class ErrorCode(enum.IntEnum):
+    """错误类型"""
+    NONE = 0
+    EMPTY = 1         # 邮箱为空
+    BAD_FORMAT = 2    # 格式无效
+    NO_MX = 3         # 域名MX记录不存在
+    SMTP_FAILED = 4   # SMTP验证失败（含熔断跳过）
+    NO_MAILBOX = 5    # RCPT返回5xx，邮箱不存在
+    ERROR = 6         # 验证过程出现异常
+
+class ValidationType(enum.IntEnum):
+    """验证方式"""
+    NONE = 0
+    KNOWN = 1  # 已知域名
+    FULL = 2   # 完整验证
+
+VALIDATION_TYPE_TEXT = ('', '已知域名', '完整验证')
+
+class EmailResult:
+    """单个邮箱的验证结果
+    
+    使用 __slots__，同一域名的结果共享MX列表与详情字符串，大批量时内存远小于字典；
+    可按键读取（result['is_valid'] 等），用于写入CSV列与结果日志。
+    """
+    __slots__ = ('email', 'status', 'error_code', 'kind', 'has_mx', 'smtp_valid',
+                 'mx_records', 'error_message', 'smtp_details', 'time_taken')
+    
+    # 可按键读取的字段
+    KEYS = frozenset(__slots__) | {'is_valid', 'validation_type', 'validation_time_ms'}
+
+    def __init__(self, email):
+        self.email = email
+        self.status = Status.INVALID
+        self.error_code = ErrorCode.NONE
+        self.kind = ValidationType.NONE
+        self.has_mx = False
+        self.smtp_valid = False
+        self.mx_records = ()
+        self.error_message = ''
+        self.smtp_details = ''
+        self.time_taken = 0
+
+    def fail(self, code: ErrorCode, message: str):
+        self.status = Status.INVALID
+        self.error_code = code
+        self.error_message = message
+
+    @property
+    def is_valid(self) -> bool:
+        return self.status == Status.VALID
+
+    @property
+    def validation_type(self) -> str:
+        return VALIDATION_TYPE_TEXT[self.kind]
+
+    @property
+    def validation_time_ms(self) -> int:
+        return self.time_taken
+
+    def __getitem__(self, key):
+        if key not in self.KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in self.KEYS
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.KEYS else default
+
+class MXCache:
+    """进程内域名MX缓存（遵循记录TTL，支持负缓存与并发查询合并）"""
+
+    def __init__(self, negative_ttl: int = 300, min_ttl: int = 60, max_ttl: int = 86400):
+        self.negative_ttl = negative_ttl  # NXDOMAIN/超时等失败结果的缓存时间
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self._lock = threading.Lock()
+        self._entries = {}   # domain -> (过期时间, 是否有MX, MX列表)
+        self._inflight = {}  # domain -> threading.Event，正在查询中的域名
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+
+    def get(self, domain: str):
+        """读取未过期的缓存，未命中返回None"""
+        with self._lock:
+            return self._get_locked(domain)
+
+    def _get_locked(self, domain: str):
+        entry = self._entries.get(domain)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._entries[domain]
+            return None
+        self.hits += 1
+        if not entry[1]:
+            self.negative_hits += 1
+        return entry[1], list(entry[2])
+
+    def put(self, domain: str, has_mx: bool, mx_list: list, ttl: int = None):
+        """写入缓存，失败结果使用负缓存时间"""
+        if has_mx:
+            ttl = min(max(ttl or 0, self.min_ttl), self.max_ttl)
+        else:
+            ttl = self.negative_ttl
+        with self._lock:
+            self._entries[domain] = (time.monotonic() + ttl, has_mx, list(mx_list))
+
+    def get_or_resolve(self, domain: str, resolve_func) -> tuple:
+        """命中直接返回；未命中时同一域名只由一个线程查询，其余线程等待结果"""
+        while True:
+            with self._lock:
+                cached = self._get_locked(domain)
+                if cached is not None:
+                    return cached
+                event = self._inflight.get(domain)
+                owner = event is None
+                if owner:
+                    event = threading.Event()
+                    self._inflight[domain] = event
+                    self.misses += 1
+            if not owner:
+                event.wait()
+                continue
+
+            try:
+                has_mx, mx_list, ttl = resolve_func(domain)
+                self.put(domain, has_mx, mx_list, ttl)
+                return has_mx, list(mx_list)
+            finally:
+                with self._lock:
+                    self._inflight.pop(domain, None)
+                event.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'negative_hits': self.negative_hits,
+                'size': len(self._entries),
+            }
+
+
+class DomainStore:
+    """跨运行持久化的域名验证结论（SQLite），记录MX列表、SMTP可达性（及可达的主机与端口）和过期时间"""
+
+    def __init__(self, path: str, ttl: float = 7 * 86400, negative_ttl: float = 86400):
+        self.path = path
+        self.ttl = ttl                    # SMTP可达结论的有效期（秒）
+        self.negative_ttl = negative_ttl  # 不可达结论的有效期（秒）
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS domains (
+                domain        TEXT PRIMARY KEY,
+                has_mx        INTEGER NOT NULL,
+                mx_records    TEXT NOT NULL,
+                smtp_valid    INTEGER NOT NULL,
+                smtp_details  TEXT NOT NULL,
+                error_message TEXT NOT NULL,
+                checked_at    REAL NOT NULL,
+                expires_at    REAL NOT NULL,
+                smtp_host     TEXT,
+                smtp_port     INTEGER
+            )
+        """)
+        # 旧版本创建的库没有可达主机与端口两列
+        columns = {row[1] for row in self.conn.execute('PRAGMA table_info(domains)')}
+        for column, kind in (('smtp_host', 'TEXT'), ('smtp_port', 'INTEGER')):
+            if column not in columns:
+                self.conn.execute(f'ALTER TABLE domains ADD COLUMN {column} {kind}')
+        self.conn.commit()
+        self.hits = 0
+        self.writes = 0
+
+    def get(self, domain: str):
+        """读取未过期的域名结论，没有则返回None"""
+        with self._lock:
+            row = self.conn.execute(
+                'SELECT has_mx, mx_records, smtp_valid, smtp_details, error_message, '
+                'smtp_host, smtp_port FROM domains WHERE domain = ? AND expires_at > ?',
+                (domain, time.time())).fetchone()
+            if row is None:
+                return None
+            self.hits += 1
+        return {
+            'has_mx': bool(row[0]),
+            'smtp_valid': bool(row[2]),
+            'mx_records': json.loads(row[1]),
+            'error_message': row[4],
+            'error_code': ErrorCode.NONE if row[2] else
+                          ErrorCode.SMTP_FAILED if row[0] else ErrorCode.NO_MX,
+            'smtp_details': row[3],
+            'time_taken': 0,
+            'smtp_host': row[5],
+            'smtp_port': row[6]
+        }
+
+    def put(self, domain: str, verdict: dict):
+        """保存域名结论，可达与不可达使用不同的有效期"""
+        now = time.time()
+        expires_at = now + (self.ttl if verdict['smtp_valid'] else self.negative_ttl)
+        with self._lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO domains (domain, has_mx, mx_records, smtp_valid, '
+                'smtp_details, error_message, checked_at, expires_at, smtp_host, smtp_port) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (domain, int(verdict['has_mx']), json.dumps(verdict['mx_records']),
+                 int(verdict['smtp_valid']), verdict['smtp_details'],
+                 verdict['error_message'], now, expires_at,
+                 verdict.get('smtp_host'), verdict.get('smtp_port')))
+            self.conn.commit()
+            self.writes += 1
+
+    def entries(self, domain: str = None) -> list:
+        """列出保存的结论 [(域名, 有MX, SMTP可达, MX列表, 检查时间, 过期时间)]"""
+        sql = ('SELECT domain, has_mx, smtp_valid, mx_records, checked_at, expires_at '
+               'FROM domains')
+        params = ()
+        if domain:
+            sql += ' WHERE domain = ?'
+            params = (domain,)
+        with self._lock:
+            rows = self.conn.execute(sql + ' ORDER BY domain', params).fetchall()
+        return [(d, bool(h), bool(v), json.loads(m), c, e) for d, h, v, m, c, e in rows]
+
+    def purge(self, target: str = 'expired') -> int:
+        """删除结论：expired 已过期的，all 全部，其他值视为单个域名"""
+        if target == 'all':
+            sql, params = 'DELETE FROM domains', ()
+        elif target == 'expired':
+            sql, params = 'DELETE FROM domains WHERE expires_at <= ?', (time.time(),)
+        else:
+            sql, params = 'DELETE FROM domains WHERE domain = ?', (target,)
+        with self._lock:
+            count = self.conn.execute(sql, params).rowcount
+            self.conn.commit()
+        return count
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+class SMTPPool:
+    """按 (MX主机, 端口) 保留空闲的SMTP会话，后续验证直接复用，省去TCP连接与TLS握手"""
+
+    def __init__(self, max_idle_per_host: int = 4, idle_timeout: float = 30):
+        self.max_idle_per_host = max_idle_per_host  # 每个主机端口保留的空闲会话数上限
+        self.idle_timeout = idle_timeout            # 空闲超过该秒数的会话不再复用
+        self._lock = threading.Lock()
+        self._idle = {}  # (主机, 端口) -> [(会话, 最近使用时间)]
+        self.opened = 0
+        self.reused = 0
+
+    def checkout(self, mx_server: str, port: int):
+        """取出一个可用的空闲会话（RSET确认仍然可用），没有则返回None"""
+        key = (mx_server, port)
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                if not idle:
+                    return None
+                smtp, last_used = idle.pop()
+            
+            if time.monotonic() - last_used <= self.idle_timeout:
+                try:
+                    if smtp.rset()[0] == 250:
+                        with self._lock:
+                            self.reused += 1
+                        return smtp
+                except Exception:
+                    pass
+            self._close(smtp)
+
+    def checkin(self, mx_server: str, port: int, smtp, new: bool = False):
+        """归还会话，超出空闲上限时直接关闭"""
+        key = (mx_server, port)
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            if new:
+                self.opened += 1
+            idle = self._idle.setdefault(key, [])
+            expired = [s for s, last_used in idle if now - last_used > self.idle_timeout]
+            idle[:] = [(s, last_used) for s, last_used in idle if now - last_used <= self.idle_timeout]
+            if len(idle) < self.max_idle_per_host:
+                idle.append((smtp, now))
+                smtp = None
+        for session in expired + ([smtp] if smtp is not None else []):
+            self._close(session)
+
+    def _close(self, smtp):
+        try:
+            smtp.quit()
+        except Exception:
+            smtp.close()
+
+    def close_all(self):
+        with self._lock:
+            sessions = [s for idle in self._idle.values() for s, _ in idle]
+            self._idle.clear()
+        for smtp in sessions:
+            self._close(smtp)
+
+
+class ValidatorMetrics:
+    """分阶段耗时统计：按阶段、MX主机、端口汇总直方图，并记录吞吐与并发数
+    
+    阶段: dns, connect(TCP连接), tls(465握手或STARTTLS), banner(等待220欢迎语), ehlo, rcpt
+    """
+    
+    # 直方图桶上限（秒）
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float('inf'))
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}  # (维度, 阶段, 标签) -> [各桶计数, 总耗时, 次数, 失败次数]
+        self.started_at = time.time()
+        self.inflight = 0
+        self.domains_done = 0
+
+    def observe(self, stage: str, seconds: float, host: str = None, port: int = None,
+                failed: bool = False):
+        """记录一次阶段耗时"""
+        keys = [('stage', stage, '')]
+        if host is not None:
+            keys.append(('host', stage, host))
+        if port is not None:
+            keys.append(('port', stage, str(port)))
+        bucket = next(i for i, bound in enumerate(self.BUCKETS) if seconds <= bound)
+        with self._lock:
+            for key in keys:
+                hist = self._histograms.get(key)
+                if hist is None:
+                    hist = self._histograms[key] = [[0] * len(self.BUCKETS), 0.0, 0, 0]
+                hist[0][bucket] += 1
+                hist[1] += seconds
+                hist[2] += 1
+                if failed:
+                    hist[3] += 1
+
+    @contextlib.contextmanager
+    def timer(self, stage: str, host: str = None, port: int = None):
+        """计时上下文，出现异常时记为失败"""
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.observe(stage, time.perf_counter() - start, host, port, failed=True)
+            raise
+        self.observe(stage, time.perf_counter() - start, host, port)
+
+    def domain_started(self):
+        with self._lock:
+            self.inflight += 1
+
+    def domain_finished(self):
+        with self._lock:
+            self.inflight -= 1
+            self.domains_done += 1
+
+    def _quantile(self, counts: list, total: int, q: float) -> float:
+        """根据直方图估算分位数（取所在桶的上限；落在最后的无穷桶时取最大的有限上限）"""
+        target = q * total
+        seen = 0
+        for bound, count in zip(self.BUCKETS, counts):
+            seen += count
+            if seen >= target:
+                return min(bound, self.BUCKETS[-2])
+        return self.BUCKETS[-2]
+
+    def _summarize(self, hist: list) -> dict:
+        counts, total_seconds, total, failed = hist
+        return {
+            'count': total,
+            'failed': failed,
+            'sum_seconds': total_seconds,
+            'avg_ms': round(total_seconds / total * 1000, 1) if total else 0,
+            'p50_ms': self._quantile(counts, total, 0.5) * 1000,
+            'p99_ms': self._quantile(counts, total, 0.99) * 1000,
+        }
+
+    def snapshot(self, processed: int = 0, top_hosts: int = 50) -> dict:
+        """导出当前统计（JSON结构），主机维度只保留次数最多的 top_hosts 个"""
+        elapsed = max(time.time() - self.started_at, 1e-9)
+        with self._lock:
+            items = [(key, [list(h[0]), h[1], h[2], h[3]]) for key, h in self._histograms.items()]
+            inflight, domains_done = self.inflight, self.domains_done
+        
+        snapshot = {
+            'timestamp': time.time(),
+            'elapsed_seconds': round(elapsed, 1),
+            'emails_processed': processed,
+            'emails_per_second': round(processed / elapsed, 2),
+            'domains_done': domains_done,
+            'domains_per_second': round(domains_done / elapsed, 2),
+            'inflight_domains': inflight,
+            'stages': {}, 'hosts': {}, 'ports': {},
+        }
+        hosts = sorted((item for item in items if item[0][0] == 'host'),
+                       key=lambda item: -item[1][2])
+        allowed_hosts = {key[2] for key, _ in hosts[:top_hosts]}
+        for (kind, stage, label), hist in items:
+            summary = self._summarize(hist)
+            summary['buckets'] = hist[0]
+            if kind == 'stage':
+                snapshot['stages'][stage] = summary
+            elif kind == 'host' and label in allowed_hosts:
+                snapshot['hosts'].setdefault(label, {})[stage] = summary
+            elif kind == 'port':
+                snapshot['ports'].setdefault(label, {})[stage] = summary
+        return snapshot
+
+    def to_prometheus(self, snapshot: dict) -> str:
+        """将快照转换为Prometheus文本格式"""
+        lines = []
+        
+        def histogram(name, labels, summary):
+            cumulative = 0
+            for bound, count in zip(self.BUCKETS, summary['buckets']):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{name}_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f'{name}_sum{{{labels}}} {summary["sum_seconds"]:.6f}')
+            lines.append(f'{name}_count{{{labels}}} {summary["count"]}')
+        
+        lines.append('# TYPE email_validator_stage_seconds histogram')
+        for stage, summary in snapshot['stages'].items():
+            histogram('email_validator_stage_seconds', f'stage="{stage}"', summary)
+        lines.append('# TYPE email_validator_host_stage_seconds histogram')
+        for host, stages in snapshot['hosts'].items():
+            for stage, summary in stages.items():
+                histogram('email_validator_host_stage_seconds',
+                          f'host="{host}",stage="{stage}"', summary)
+        lines.append('# TYPE email_validator_port_stage_seconds histogram')
+        for port, stages in snapshot['ports'].items():
+            for stage, summary in stages.items():
+                histogram('email_validator_port_stage_seconds',
+                          f'port="{port}",stage="{stage}"', summary)
+        lines.append('# TYPE email_validator_stage_failures_total counter')
+        for stage, summary in snapshot['stages'].items():
+            lines.append(f'email_validator_stage_failures_total{{stage="{stage}"}} {summary["failed"]}')
+        lines.append('# TYPE email_validator_emails_processed_total counter')
+        lines.append(f"email_validator_emails_processed_total {snapshot['emails_processed']}")
+        lines.append('# TYPE email_validator_emails_per_second gauge')
+        lines.append(f"email_validator_emails_per_second {snapshot['emails_per_second']}")
+        lines.append('# TYPE email_validator_domains_done_total counter')
+        lines.append(f"email_validator_domains_done_total {snapshot['domains_done']}")
+        lines.append('# TYPE email_validator_inflight_domains gauge')
+        lines.append(f"email_validator_inflight_domains {snapshot['inflight_domains']}")
+        return '\n'.join(lines) + '\n'
+
+    def summary_lines(self) -> list:
+        """最终统计中的分阶段耗时"""
+        lines = []
+        for stage, summary in self.snapshot(top_hosts=0)['stages'].items():
+            # 分位数落在最后的无穷桶时，只知道超过最大的有限上限
+            below = sum(summary['buckets'][:-1])
+            p50 = ('>' if below < 0.5 * summary['count'] else '≤') + f"{summary['p50_ms']:g}"
+            p99 = ('>' if below < 0.99 * summary['count'] else '≤') + f"{summary['p99_ms']:g}"
+            lines.append(f"- 阶段 {stage}: {summary['count']} 次, 平均 {summary['avg_ms']}ms, "
+                         f"p50{p50}ms, p99{p99}ms, 失败 {summary['failed']}")
+        return lines
+
+
+class MetricsReporter:
+    """后台线程定期将统计快照写入文件（JSON或Prometheus文本）"""
+
+    def __init__(self, metrics: ValidatorMetrics, path: str, fmt: str = 'json',
+                 interval: float = 10, progress=None):
+        self.metrics = metrics
+        self.path = path
+        self.fmt = fmt
+        self.interval = interval
+        self.progress = progress  # 返回已处理邮箱数的函数
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='metrics-reporter', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def write(self):
+        """写入一次快照（先写临时文件再替换，读取方不会看到半个文件）"""
+        snapshot = self.metrics.snapshot(self.progress() if self.progress else 0)
+        if self.fmt == 'prometheus':
+            content = self.metrics.to_prometheus(snapshot)
+        else:
+            content = json.dumps(snapshot, ensure_ascii=False, indent=2, allow_nan=False)
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logging.error(f"写入统计文件失败: {str(e)}")
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.write()
+
+
+class TimedSMTP(smtplib.SMTP):
+    """记录TCP连接耗时的SMTP"""
+    tcp_time = 0.0
+    tls_time = 0.0
+
+    def _get_socket(self, host, port, timeout):
+        start = time.perf_counter()
+        sock = super()._get_socket(host, port, timeout)
+        self.tcp_time = time.perf_counter() - start
+        return sock
+
+
+class TimedSMTP_SSL(smtplib.SMTP_SSL):
+    """分别记录TCP连接与TLS握手耗时的SMTP_SSL"""
+    tcp_time = 0.0
+    tls_time = 0.0
+
+    def _get_socket(self, host, port, timeout):
+        start = time.perf_counter()
+        sock = smtplib.SMTP._get_socket(self, host, port, timeout)
+        self.tcp_time = time.perf_counter() - start
+        start = time.perf_counter()
+        sock = self.context.wrap_socket(sock, server_hostname=self._host)
+        self.tls_time = time.perf_counter() - start
+        return sock
+
+
+# 熔断期间快速失败时的说明文字（此类结论不写入域名结论库）
+CIRCUIT_OPEN_TEXT = '主机熔断中，已跳过'
+
+class HostHealth:
+    """按MX主机跟踪健康状况，并自适应调整每个主机的并发数
+    
+    连续失败达到 failure_threshold 次后熔断：cooldown 秒内直接失败，冷却后放行一次探测，
+    探测成功则恢复，失败则继续熔断。并发上限按AIMD调整：延迟与失败率正常时缓慢增加，
+    出错时减半，延迟超过 target_latency 时小幅降低。
+    """
+
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 60,
+                 min_limit: int = 1, max_limit: int = 10, target_latency: float = 2.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self._cond = threading.Condition()
+        self._hosts = {}
+        self.opened = 0    # 熔断打开次数
+        self.rejected = 0  # 熔断期间快速失败次数
+
+    def _state(self, host: str) -> dict:
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = {
+                'failures': 0,        # 连续失败次数
+                'open_until': 0.0,    # 熔断结束时间，0表示未熔断
+                'probing': False,     # 冷却后是否已放行探测
+                'limit': float(max(self.min_limit, self.max_limit // 2)),
+                'active': 0,
+                'latency': None,      # 延迟的滑动平均（秒）
+                'error_rate': 0.0,    # 失败率的滑动平均
+            }
+        return state
+
+    def allow(self, host: str) -> bool:
+        """是否允许访问该主机；熔断冷却结束后只放行一次探测"""
+        with self._cond:
+            state = self._state(host)
+            if not state['open_until']:
+                return True
+            if time.monotonic() < state['open_until'] or state['probing']:
+                self.rejected += 1
+                return False
+            state['probing'] = True
+            return True
+
+    def abandon(self, host: str):
+        """放行后未产生结果（如竞速中被取消），撤销探测标记"""
+        with self._cond:
+            self._state(host)['probing'] = False
+
+    def record(self, host: str, ok: bool, latency: float):
+        """记录一次访问结果，更新熔断状态与并发上限"""
+        with self._cond:
+            state = self._state(host)
+            state['error_rate'] = 0.8 * state['error_rate'] + (0 if ok else 0.2)
+            if ok:
+                state['latency'] = latency if state['latency'] is None else \
+                    0.8 * state['latency'] + 0.2 * latency
+                state['failures'] = 0
+                state['open_until'] = 0.0
+                if state['latency'] <= self.target_latency and state['error_rate'] < 0.2:
+                    state['limit'] = min(self.max_limit, state['limit'] + 1 / state['limit'])
+                else:
+                    state['limit'] = max(self.min_limit, state['limit'] * 0.9)
+            else:
+                state['failures'] += 1
+                state['limit'] = max(self.min_limit, state['limit'] / 2)
+                if state['probing'] or (self.failure_threshold and
+                                        state['failures'] >= self.failure_threshold):
+                    if not state['open_until']:
+                        self.opened += 1
+                    state['open_until'] = time.monotonic() + self.cooldown
+            state['probing'] = False
+            self._cond.notify_all()
+
+    def try_acquire(self, host: str) -> bool:
+        """不阻塞地占用一个并发名额"""
+        with self._cond:
+            state = self._state(host)
+            if state['active'] >= int(state['limit']):
+                return False
+            state['active'] += 1
+            return True
+
+    def acquire(self, host: str):
+        """占用一个并发名额，达到当前上限时等待"""
+        with self._cond:
+            state = self._state(host)
+            while state['active'] >= int(state['limit']):
+                self._cond.wait()
+            state['active'] += 1
+
+    def release(self, host: str):
+        with self._cond:
+            self._state(host)['active'] -= 1
+            self._cond.notify_all()
+
+    @contextlib.contextmanager
+    def slot(self, host: str):
+        self.acquire(host)
+        try:
+            yield
+        finally:
+            self.release(host)
+
+    def open_hosts(self) -> int:
+        """当前处于熔断中的主机数"""
+        now = time.monotonic()
+        with self._cond:
+            return sum(1 for state in self._hosts.values() if state['open_until'] > now)
+
+
+class ResolverPool:
+    """并行向多个上游DNS查询，取第一个有效应答（NOERROR或NXDOMAIN）
+    
+    上游按预计耗时排序（延迟与失败率的滑动平均），同时查询最靠前的 fanout 个；某个上游出错
+    或 attempt_timeout 秒未应答时补发给下一个，全部超时后重发，整体不超过 lifetime 秒。
+    配置了本地缓存DNS（local）且状况良好时先只查询本地，local_grace 秒内未应答再同时查询上游；
+    本地DNS失败率过高时排到最后备用，每 local_cooldown 秒放行一次优先查询作为探测，应答后即恢复；
+    本地DNS立即出错（如ICMP端口不可达）时不再等待 local_grace。
+    上游可写作 地址#端口。同步查询在调用线程内用非阻塞UDP套接字完成；被抢先的上游由一个后台线程
+    继续等待应答（最多 attempt_timeout 秒），按实际耗时记录延迟。
+    """
+
+    def __init__(self, nameservers=('8.8.8.8', '1.1.1.1'), local: str = None, fanout: int = 2,
+                 attempt_timeout: float = 1.5, lifetime: float = 5, local_grace: float = 0.05,
+                 local_cooldown: float = 30, port: int = 53):
+        self.nameservers = list(nameservers)
+        self.local = local
+        self.fanout = fanout
+        self.attempt_timeout = attempt_timeout
+        self.lifetime = lifetime
+        self.local_grace = local_grace
+        self.local_cooldown = local_cooldown
+        self.port = port
+        self._lock = threading.Lock()
+        self._servers = {}
+        self._late = None       # 交给后台线程等待迟到应答的套接字
+        self._late_wake = None  # 唤醒后台线程的套接字对
+
+    def _state(self, server: str) -> dict:
+        state = self._servers.get(server)
+        if state is None:
+            state = self._servers[server] = {
+                'sent': 0,          # 发出的查询数
+                'wins': 0,          # 最先给出有效应答的次数
+                'errors': 0,        # 出错或超时次数
+                'latency': None,    # 延迟的滑动平均（秒）
+                'error_rate': 0.0,  # 失败率的滑动平均
+                'probe_at': 0.0,    # 异常后下次放行探测的时间
+            }
+        return state
+
+    def _expected(self, server: str) -> float:
+        """预计耗时：出错时按等满 attempt_timeout 计"""
+        state = self._state(server)
+        return (state['latency'] or 0) * (1 - state['error_rate']) + \
+            self.attempt_timeout * state['error_rate']
+
+    def address(self, server: str) -> tuple:
+        """地址#端口 -> (地址, 端口)"""
+        host, _, port = server.partition('#')
+        return host, int(port) if port else self.port
+
+    def plan(self) -> tuple:
+        """本次查询的发送计划 [(相对开始的延迟, 上游)]，以及出错时依次补发的备用上游"""
+        with self._lock:
+            upstreams = sorted(self.nameservers, key=self._expected)
+            local_ok = False
+            if self.local is not None:
+                state = self._state(self.local)
+                local_ok = state['error_rate'] < 0.5
+                # 异常的本地DNS只作为备用，很少被查询，失败率不会自行下降；冷却后放行一次探测
+                now = time.monotonic()
+                if not local_ok and now >= state['probe_at']:
+                    if state['probe_at']:
+                        local_ok = True
+                    state['probe_at'] = now + self.local_cooldown
+        scheduled, delay = [], 0.0
+        if local_ok:
+            scheduled.append((0.0, self.local))
+            delay = self.local_grace
+        elif self.local is not None:
+            upstreams.append(self.local)  # 本地DNS异常时排在最后备用
+        scheduled += [(delay, server) for server in upstreams[:self.fanout]]
+        return scheduled, upstreams[self.fanout:]
+
+    def record(self, server: str, ok: bool, latency: float, win: bool = True):
+        """记录一次查询结果；win=False 为被抢先后迟到的应答"""
+        with self._lock:
+            state = self._state(server)
+            state['error_rate'] = 0.8 * state['error_rate'] + (0 if ok else 0.2)
+            if ok:
+                state['probe_at'] = 0.0
+                if win:
+                    state['wins'] += 1
+                state['latency'] = latency if state['latency'] is None else \
+                    0.8 * state['latency'] + 0.2 * latency
+            else:
+                state['errors'] += 1
+
+    def _watch_late(self, late: list):
+        """被抢先的上游 [(套接字, 上游, 发送时间, 查询)] 交给后台线程继续等待应答"""
+        with self._lock:
+            if self._late is None:
+                self._late = queue.SimpleQueue()
+                self._late_wake = socket.socketpair()
+                threading.Thread(target=self._collect_late, name='dns-late', daemon=True).start()
+        self._late.put(late)
+        self._late_wake[1].send(b'\0')
+
+    def _collect_late(self):
+        """后台线程：读取迟到的应答按实际耗时记录，attempt_timeout 秒仍未应答的记为超时"""
+        wake = self._late_wake[0]
+        selector = selectors.DefaultSelector()
+        selector.register(wake, selectors.EVENT_READ)
+        watching = {}  # 套接字 -> (上游, 发送时间, 查询)
+        while True:
+            expiry = min((sent + self.attempt_timeout for _, sent, _ in watching.values()), default=None)
+            timeout = None if expiry is None else max(0, expiry - time.monotonic())
+            for key, _ in selector.select(timeout):
+                sock = key.fileobj
+                if sock is wake:
+                    wake.recv(4096)
+                    while True:
+                        try:
+                            late = self._late.get_nowait()
+                        except queue.Empty:
+                            break
+                        for late_sock, server, sent, request in late:
+                            selector.register(late_sock, selectors.EVENT_READ)
+                            watching[late_sock] = (server, sent, request)
+                    continue
+                server, sent, request = watching[sock]
+                elapsed = time.monotonic() - sent
+                try:
+                    response = dns.message.from_wire(sock.recv(65535))
+                except (OSError, dns.exception.DNSException):
+                    response = None
+                if response is not None and not request.is_response(response):
+                    continue  # 与查询不匹配的报文直接忽略
+                ok = response is not None and \
+                    response.rcode() in (dns.rcode.NOERROR, dns.rcode.NXDOMAIN)
+                self.record(server, ok, elapsed, win=False)
+                selector.unregister(sock)
+                sock.close()
+                del watching[sock]
+            now = time.monotonic()
+            for sock, (server, sent, _) in list(watching.items()):
+                if now - sent >= self.attempt_timeout:
+                    self.record(server, False, now - sent, win=False)
+                    selector.unregister(sock)
+                    sock.close()
+                    del watching[sock]
+
+    def _late_done(self, server: str, sent: float, task):
+        """异步查询被抢先的上游完成时按实际耗时记录"""
+        if task.cancelled():
+            return
+        elapsed = time.monotonic() - sent
+        ok = task.exception() is None and \
+            task.result().rcode() in (dns.rcode.NOERROR, dns.rcode.NXDOMAIN)
+        self.record(server, ok, elapsed, win=False)
+
+    def _sent(self, server: str):
+        with self._lock:
+            self._state(server)['sent'] += 1
+
+    def _accept(self, server: str, response, elapsed: float, errors: list) -> bool:
+        """NOERROR与NXDOMAIN是有效应答；SERVFAIL、REFUSED等记为该上游出错"""
+        if response.rcode() in (dns.rcode.NOERROR, dns.rcode.NXDOMAIN):
+            self.record(server, True, elapsed)
+            return True
+        self.record(server, False, elapsed)
+        errors.append((server, False, self.address(server)[1], dns.rcode.to_text(response.rcode()), response))
+        return False
+
+    def _send(self, wire: bytes, server: str) -> socket.socket:
+        """发送UDP查询；套接字绑定到该上游，只接收它的应答"""
+        host, port = self.address(server)
+        sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.setblocking(False)
+            sock.connect((host, port))
+            sock.send(wire)
+        except OSError:
+            sock.close()
+            raise
+        self._sent(server)
+        return sock
+
+    def query(self, qname, rdtype) -> tuple:
+        """同步查询，返回(应答的上游, 应答报文)"""
+        request = dns.message.make_query(qname, rdtype)
+        wire = request.to_wire()
+        start = time.monotonic()
+        deadline = start + self.lifetime
+        scheduled, reserve = self.plan()
+        scheduled = [(start + delay, server) for delay, server in scheduled]
+        selector = selectors.DefaultSelector()
+        pending = {}    # 套接字 -> (上游, 发送时间)
+        timed_out = []  # 超时未应答的上游，备用上游用完后重发
+        errors = []
+
+        def drop(sock):
+            selector.unregister(sock)
+            sock.close()
+            pending.pop(sock)
+            # 补发给下一个备用上游
+            if reserve:
+                scheduled.append((time.monotonic(), reserve.pop(0)))
+
+        def fail(sock, server, elapsed, error):
+            self.record(server, False, elapsed)
+            errors.append((server, False, self.address(server)[1], error, None))
+            drop(sock)
+
+        def hurry(server):
+            """本地DNS出错时不必等满 local_grace，立即向上游发送"""
+            if server == self.local:
+                now = time.monotonic()
+                scheduled[:] = [(min(at, now), other) for at, other in scheduled]
+
+        try:
+            while True:
+                now = time.monotonic()
+                if now >= deadline:
+                    raise resolver.LifetimeTimeout(timeout=now - start, errors=errors)
+                for item in [item for item in scheduled if item[0] <= now]:
+                    scheduled.remove(item)
+                    try:
+                        sock = self._send(wire, item[1])
+                    except OSError as e:
+                        self.record(item[1], False, 0)
+                        errors.append((item[1], False, self.address(item[1])[1], e, None))
+                        hurry(item[1])
+                        if reserve:
+                            scheduled.append((now, reserve.pop(0)))
+                        continue
+                    selector.register(sock, selectors.EVENT_READ)
+                    pending[sock] = (item[1], now)
+                for sock, (server, sent) in list(pending.items()):
+                    if now - sent >= self.attempt_timeout:
+                        timed_out.append(server)
+                        fail(sock, server, now - sent, 'timeout')
+                if not pending and not scheduled:
+                    if not reserve and not timed_out:
+                        raise resolver.NoNameservers(request=request, errors=errors)
+                    reserve, timed_out = reserve + timed_out, []
+                    scheduled.append((now, reserve.pop(0)))
+                    continue
+
+                wake = min([deadline] + [at for at, _ in scheduled] +
+                           [sent + self.attempt_timeout for _, sent in pending.values()])
+                for key, _ in selector.select(max(0, wake - now)):
+                    sock = key.fileobj
+                    server, sent = pending[sock]
+                    elapsed = time.monotonic() - sent
+                    try:
+                        response = dns.message.from_wire(sock.recv(65535))
+                    except (OSError, dns.exception.DNSException) as e:
+                        # 端口不可达（ICMP）或报文无法解析
+                        fail(sock, server, elapsed, e)
+                        hurry(server)
+                        continue
+                    if not request.is_response(response):
+                        continue  # 与查询不匹配的报文直接忽略
+                    if response.flags & dns.flags.TC:
+                        # 应答被截断时改用TCP向同一上游查询
+                        host, port = self.address(server)
+                        try:
+                            response = dns.query.tcp(request, host, port=port,
+                                                     timeout=max(0.1, deadline - time.monotonic()))
+                        except (OSError, dns.exception.DNSException) as e:
+                            fail(sock, server, elapsed, e)
+                            hurry(server)
+                            continue
+                    if self._accept(server, response, elapsed, errors):
+                        selector.unregister(sock)
+                        sock.close()
+                        pending.pop(sock)
+                        # 其余上游继续等待应答，记录其实际延迟
+                        late = [(other, name, at, request) for other, (name, at) in pending.items()]
+                        for other in pending:
+                            selector.unregister(other)
+                        pending.clear()
+                        if late:
+                            self._watch_late(late)
+                        return server, response
+                    drop(sock)
+                    hurry(server)
+        finally:
+            for sock in pending:
+                sock.close()
+            selector.close()
+
+    async def query_async(self, qname, rdtype) -> tuple:
+        """异步查询，返回(应答的上游, 应答报文)"""
+        request = dns.message.make_query(qname, rdtype)
+        start = time.monotonic()
+        deadline = start + self.lifetime
+        scheduled, reserve = self.plan()
+        scheduled = [(start + delay, server) for delay, server in scheduled]
+        tasks = {}      # 任务 -> (上游, 发送时间)
+        timed_out = []
+        errors = []
+
+        async def attempt(server):
+            host, port = self.address(server)
+            # 已连接的套接字才能收到ICMP端口不可达，立即出错而不是等到超时
+            sock = await dns.asyncbackend.get_default_backend().make_socket(
+                socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_DGRAM,
+                destination=(host, port))
+            try:
+                response = await dns.asyncquery.udp(request, host, timeout=self.attempt_timeout,
+                                                    port=port, sock=sock)
+            finally:
+                await sock.close()
+            if response.flags & dns.flags.TC:
+                response = await dns.asyncquery.tcp(request, host, timeout=self.attempt_timeout,
+                                                    port=port)
+            return response
+
+        def hurry(server):
+            """本地DNS出错时不必等满 local_grace，立即向上游发送"""
+            if server == self.local:
+                now = time.monotonic()
+                scheduled[:] = [(min(at, now), other) for at, other in scheduled]
+
+        try:
+            while True:
+                now = time.monotonic()
+                if now >= deadline:
+                    raise resolver.LifetimeTimeout(timeout=now - start, errors=errors)
+                for item in [item for item in scheduled if item[0] <= now]:
+                    scheduled.remove(item)
+                    self._sent(item[1])
+                    tasks[asyncio.ensure_future(attempt(item[1]))] = (item[1], now)
+                if not tasks and not scheduled:
+                    if not reserve and not timed_out:
+                        raise resolver.NoNameservers(request=request, errors=errors)
+                    reserve, timed_out = reserve + timed_out, []
+                    scheduled.append((now, reserve.pop(0)))
+                    continue
+
+                wake = min([deadline] + [at for at, _ in scheduled]) - now
+                if not tasks:
+                    await asyncio.sleep(wake)
+                    continue
+                done, _ = await asyncio.wait(tasks, timeout=max(0, wake),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    server, sent = tasks.pop(task)
+                    elapsed = time.monotonic() - sent
+                    try:
+                        response = task.result()
+                    except (OSError, dns.exception.DNSException) as e:
+                        if isinstance(e, dns.exception.Timeout):
+                            timed_out.append(server)
+                        self.record(server, False, elapsed)
+                        errors.append((server, False, self.address(server)[1], e, None))
+                        hurry(server)
+                        if reserve:
+                            scheduled.append((time.monotonic(), reserve.pop(0)))
+                        continue
+                    if self._accept(server, response, elapsed, errors):
+                        # 其余上游继续等待应答（最多 attempt_timeout 秒），记录其实际延迟
+                        for task, (other, sent) in tasks.items():
+                            task.add_done_callback(functools.partial(self._late_done, other, sent))
+                        tasks.clear()
+                        return server, response
+                    hurry(server)
+                    if reserve:
+                        scheduled.append((time.monotonic(), reserve.pop(0)))
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def answer(self, qname, rdtype, server: str, response):
+        """将应答报文转换为与 Resolver.resolve 相同的结果，NXDOMAIN与无记录时抛出相同的异常"""
+        if response.rcode() == dns.rcode.NXDOMAIN:
+            raise resolver.NXDOMAIN(qnames=[qname], responses={qname: response})
+        host, port = self.address(server)
+        answer = resolver.Answer(qname, rdtype, dns.rdataclass.IN, response, host, port)
+        if answer.rrset is None:
+            raise resolver.NoAnswer(response=response)
+        return answer
+
+    def resolve(self, domain: str, rdtype: str = 'MX'):
+        """同步查询，用法同 Resolver.resolve"""
+        qname, rdtype = dns.name.from_text(domain), dns.rdatatype.from_text(rdtype)
+        return self.answer(qname, rdtype, *self.query(qname, rdtype))
+
+    async def resolve_async(self, domain: str, rdtype: str = 'MX'):
+        """异步查询，用法同 asyncresolver.Resolver.resolve"""
+        qname, rdtype = dns.name.from_text(domain), dns.rdatatype.from_text(rdtype)
+        return self.answer(qname, rdtype, *await self.query_async(qname, rdtype))
+
+    def snapshot(self) -> dict:
+        """各上游的查询数、抢先应答数、出错数、平均延迟与失败率"""
+        with self._lock:
+            return {
+                server: {
+                    'sent': state['sent'],
+                    'wins': state['wins'],
+                    'errors': state['errors'],
+                    'latency_ms': round(state['latency'] * 1000, 1) if state['latency'] is not None else None,
+                    'error_rate': round(state['error_rate'], 3),
+                }
+                for server, state in self._servers.items()
+            }
+
+    def summary_lines(self) -> list:
+        """汇总输出用的每个上游一行"""
+        return [f"- DNS上游 {server}: 查询 {stats['sent']} / 抢先应答 {stats['wins']} / "
+                f"出错 {stats['errors']} / 平均延迟 {stats['latency_ms']}ms"
+                for server, stats in self.snapshot().items()]
+
+
 class EmailValidator:
-    def __init__(self, timeout: int = 5):
+    def __init__(self, timeout: int = 5, mx_cache: MXCache = None,
+                 smtp_race: bool = False, race_stagger: float = 0.25,
+                 smtp_deadline: float = 15, race_workers: int = 64,
+                 store: DomainStore = None, smtp_pool: SMTPPool = None,
+                 rcpt_probe: bool = False, mail_from: str = '', rcpt_batch: int = 50,
+                 metrics: ValidatorMetrics = None, host_health: HostHealth = None,
+                 nameservers: list = None, resolver_pool: ResolverPool = None):
         self.timeout = timeout
         self.basic_regex = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
+        self.email_pattern = re.compile(self.basic_regex)
         self.smtp_ports = [25, 587, 465]  # 常用SMTP端口
         
         # 已知的有效域名列表
@@ -40,141 +1158,857 @@ class EmailValidator:
         self.resolver = resolver.Resolver()
         self.resolver.timeout = timeout
         self.resolver.lifetime = timeout
-        self.resolver.nameservers = [
+        self.resolver.nameservers = list(nameservers) if nameservers else [
             '8.8.8.8',    # Google DNS
             '1.1.1.1',    # Cloudflare DNS
         ]
+        # 并行查询多个上游的解析池，未启用时为None（按顺序逐个查询 nameservers）
+        self.resolver_pool = resolver_pool
+
+        # 域名MX缓存，多个验证器可共享同一个实例
+        self.mx_cache = mx_cache if mx_cache is not None else MXCache()
+        
+        # SMTP竞速模式：并行尝试多个主机与端口，取第一个成功的连接
+        self.smtp_race = smtp_race
+        self.race_stagger = race_stagger    # 相邻尝试的启动间隔（秒）
+        self.smtp_deadline = smtp_deadline  # 每个域名SMTP验证的整体时限（秒）
+        self.race_workers = race_workers
+        self._race_executor = None
+        self._race_lock = threading.Lock()
+        
+        # 跨运行持久化的域名结论，命中时无需任何网络请求
+        self.store = store
+        
+        # SMTP会话池；启用RCPT探测时在同一会话中批量探测邮箱是否存在
+        self.smtp_pool = smtp_pool
+        self.rcpt_probe = rcpt_probe
+        self.mail_from = mail_from    # 空字符串表示 MAIL FROM:<>
+        self.rcpt_batch = rcpt_batch  # 每个事务（MAIL FROM之后）探测的收件人数
+        
+        # 分阶段耗时统计
+        self.metrics = metrics if metrics is not None else ValidatorMetrics()
+        
+        # 按MX主机熔断与自适应并发，未启用时为None
+        self.host_health = host_health
     
     def verify_dns(self, domain: str) -> tuple:
-        """验证域名DNS记录"""
+        """验证域名DNS记录（优先读取缓存）"""
+        return self.mx_cache.get_or_resolve(domain, self._resolve_mx)
+
+    def _resolve_mx(self, domain: str) -> tuple:
+        """查询MX记录，返回(是否有MX, MX列表, TTL)"""
+        start = time.perf_counter()
         try:
-            mx_records = self.resolver.resolve(domain, 'MX')
+            mx_records = (self.resolver_pool or self.resolver).resolve(domain, 'MX')
             # 按优先级排序MX记录
             mx_list = sorted([(r.preference, str(r.exchange).rstrip('.')) 
                             for r in mx_records])
-            return True, [mx for _, mx in mx_list]
+            self.metrics.observe('dns', time.perf_counter() - start)
+            return True, [mx for _, mx in mx_list], mx_records.rrset.ttl
         except Exception as e:
-            return False, []
+            self.metrics.observe('dns', time.perf_counter() - start, failed=True)
+            return False, [], None
+
+    def describe_smtp_error(self, port: int, e: Exception) -> str:
+        """将SMTP连接异常转换为错误描述"""
+        if isinstance(e, (socket.timeout, asyncio.TimeoutError)):
+            return f"端口{port}超时"
+        if isinstance(e, ConnectionRefusedError):
+            return f"端口{port}被拒绝"
+        if isinstance(e, ssl.SSLError):
+            return f"端口{port} SSL错误"
+        return f"端口{port}错误: {str(e)}"
+
+    def smtp_success_text(self, port: int) -> str:
+        if port == 465:
+            return f"SSL连接成功(端口{port})"
+        return f"连接成功(端口{port})"
+
+    def _open_session(self, mx_server: str, port: int, timeout: float,
+                      sessions: list = None, cancelled: threading.Event = None):
+        """建立连接并完成EHLO（587端口尝试STARTTLS），返回已就绪的SMTP会话
+        
+        sessions 用于登记连接对象，以便竞速时由其他线程关闭落败的连接
+        """
+        if port == 465:
+            # SSL连接
+            smtp = TimedSMTP_SSL(timeout=timeout, context=ssl.create_default_context())
+        else:
+            # 普通连接
+            smtp = TimedSMTP(timeout=timeout)
+        if sessions is not None:
+            sessions.append(smtp)
+        
+        try:
+            start = time.perf_counter()
+            try:
+                smtp.connect(mx_server, port=port)
+            except Exception:
+                self._observe_connect(smtp, mx_server, port, time.perf_counter() - start, True)
+                raise
+            self._observe_connect(smtp, mx_server, port, time.perf_counter() - start, False)
+            if cancelled is not None and cancelled.is_set():
+                raise RuntimeError('已取消')
+            with self.metrics.timer('ehlo', mx_server, port):
+                smtp.ehlo()
+            
+            # 如果服务器支持STARTTLS，尝试升级到TLS
+            if port == 587:
+                try:
+                    with self.metrics.timer('tls', mx_server, port):
+                        smtp.starttls()
+                    with self.metrics.timer('ehlo', mx_server, port):
+                        smtp.ehlo()
+                except:
+                    pass
+        except Exception:
+            smtp.close()
+            raise
+        return smtp
+
+    def _observe_connect(self, smtp, mx_server: str, port: int, elapsed: float, failed: bool):
+        """connect() 包含TCP连接、465端口的TLS握手与等待欢迎语，拆分记录各阶段耗时"""
+        metrics = self.metrics
+        if not smtp.tcp_time:
+            metrics.observe('connect', elapsed, mx_server, port, failed=failed)
+            return
+        metrics.observe('connect', smtp.tcp_time, mx_server, port)
+        if port == 465:
+            if not smtp.tls_time:
+                metrics.observe('tls', elapsed - smtp.tcp_time, mx_server, port, failed=failed)
+                return
+            metrics.observe('tls', smtp.tls_time, mx_server, port)
+        metrics.observe('banner', elapsed - smtp.tcp_time - smtp.tls_time, mx_server, port,
+                        failed=failed)
+
+    def _release_session(self, mx_server: str, port: int, smtp, new: bool = False):
+        """用完的会话放回会话池，未启用会话池时直接QUIT"""
+        if self.smtp_pool is not None:
+            self.smtp_pool.checkin(mx_server, port, smtp, new=new)
+            return
+        try:
+            smtp.quit()
+        except Exception:
+            smtp.close()
+
+    def _smtp_attempt(self, mx_server: str, port: int, timeout: float,
+                      sessions: list = None, cancelled: threading.Event = None) -> str:
+        """在单个端口上验证SMTP可达性（优先复用会话池中的会话），成功返回详情，失败抛出异常"""
+        if cancelled is not None and cancelled.is_set():
+            raise RuntimeError('已取消')
+        
+        smtp = self.smtp_pool.checkout(mx_server, port) if self.smtp_pool is not None else None
+        new = smtp is None
+        if new:
+            smtp = self._open_session(mx_server, port, timeout, sessions, cancelled)
+        self._release_session(mx_server, port, smtp, new=new)
+        return self.smtp_success_text(port)
+
+    def _race_attempt(self, mx_server: str, port: int, timeout: float,
+                      sessions: list, cancelled: threading.Event) -> str:
+        """竞速中的单个尝试：启用HostHealth时先占用主机的并发名额，竞速结束则放弃等待"""
+        if self.host_health is None:
+            return self._smtp_attempt(mx_server, port, timeout, sessions, cancelled)
+        while not self.host_health.try_acquire(mx_server):
+            if cancelled.wait(0.05):
+                raise RuntimeError('已取消')
+        try:
+            return self._smtp_attempt(mx_server, port, timeout, sessions, cancelled)
+        finally:
+            self.host_health.release(mx_server)
+
+    def _verify_smtp_ports(self, mx_server: str) -> tuple:
+        """依次尝试多个端口，返回(是否成功, 详情, 成功的端口)"""
+        health = self.host_health
+        if health is not None and not health.allow(mx_server):
+            return False, CIRCUIT_OPEN_TEXT, None
+        
+        error_messages = []
+        start = time.monotonic()
+        
+        with health.slot(mx_server) if health is not None else contextlib.nullcontext():
+            for port in self.smtp_ports:
+                try:
+                    details = self._smtp_attempt(mx_server, port, self.timeout)
+                except Exception as e:
+                    error_messages.append(self.describe_smtp_error(port, e))
+                    continue
+                if health is not None:
+                    health.record(mx_server, True, time.monotonic() - start)
+                return True, details, port
+        
+        if health is not None:
+            health.record(mx_server, False, time.monotonic() - start)
+        return False, " | ".join(error_messages), None
 
     def verify_smtp(self, mx_server: str) -> tuple:
         """验证SMTP连接，尝试多个端口"""
-        error_messages = []
+        smtp_valid, details, _ = self._verify_smtp_ports(mx_server)
+        return smtp_valid, details
+
+    def verify_mx_servers(self, mx_servers: list) -> tuple:
+        """验证MX服务器的SMTP可达性，返回(是否成功, 详情, 成功的主机, 成功的端口)"""
+        if self.smtp_race:
+            return self.race_smtp(mx_servers)
         
-        for port in self.smtp_ports:
+        smtp_details = ''
+        for mx_server in mx_servers:
+            smtp_valid, details, port = self._verify_smtp_ports(mx_server)
+            if smtp_valid:
+                return True, details, mx_server, port
+            smtp_details = f"{mx_server}: {details}"
+        return False, smtp_details, None, None
+
+    def probe_mailboxes(self, verdict: dict, emails: list) -> dict:
+        """在同一SMTP会话中批量发送RCPT TO探测邮箱是否存在
+        
+        返回 {邮箱: (响应码, 响应信息)}，会话中途断开时重连一次
+        """
+        mx_server = verdict.get('smtp_host') or verdict['mx_records'][0]
+        port = verdict.get('smtp_port') or self.smtp_ports[0]
+        pending = list(dict.fromkeys(emails))
+        outcomes = {}
+        last_error = ''
+        
+        for _ in range(2):
+            if not pending:
+                break
+            smtp = self.smtp_pool.checkout(mx_server, port) if self.smtp_pool is not None else None
+            new = smtp is None
             try:
-                if port == 465:
-                    # SSL连接
-                    context = ssl.create_default_context()
-                    with smtplib.SMTP_SSL(mx_server, port, 
-                                        timeout=self.timeout, 
-                                        context=context) as smtp:
-                        smtp.ehlo()
-                        return True, f"SSL连接成功(端口{port})"
-                else:
-                    # 普通连接
-                    with smtplib.SMTP(timeout=self.timeout) as smtp:
-                        smtp.connect(mx_server, port=port)
-                        smtp.ehlo()
-                        
-                        # 如果服务器支持STARTTLS，尝试升级到TLS
-                        if port == 587:
-                            try:
-                                smtp.starttls()
-                                smtp.ehlo()
-                            except:
-                                pass
-                        
-                        return True, f"连接成功(端口{port})"
-                        
-            except socket.timeout:
-                error_messages.append(f"端口{port}超时")
-            except ConnectionRefusedError:
-                error_messages.append(f"端口{port}被拒绝")
-            except ssl.SSLError:
-                error_messages.append(f"端口{port} SSL错误")
+                if new:
+                    smtp = self._open_session(mx_server, port, self.timeout)
+                while pending:
+                    batch = pending[:self.rcpt_batch]
+                    code, message = smtp.mail(self.mail_from)
+                    if code != 250:
+                        # 发件人被拒绝时无法判断邮箱是否存在
+                        for email in pending:
+                            outcomes[email] = (code, message.decode('utf-8', 'replace'))
+                        pending = []
+                        break
+                    for email in batch:
+                        with self.metrics.timer('rcpt', mx_server, port):
+                            code, message = smtp.rcpt(email)
+                        outcomes[email] = (code, message.decode('utf-8', 'replace'))
+                    pending = pending[len(batch):]
+                    smtp.rset()
+                self._release_session(mx_server, port, smtp, new=new)
             except Exception as e:
-                error_messages.append(f"端口{port}错误: {str(e)}")
+                last_error = str(e)
+                if smtp is not None:
+                    smtp.close()
         
-        return False, " | ".join(error_messages)
+        for email in pending:
+            outcomes[email] = (-1, f"探测失败: {last_error}")
+        return outcomes
 
-    def validate_email(self, email: str) -> dict:
-        """验证单个邮箱"""
-        result = {
-            'email': email,
-            'is_valid': False,
+    def race_candidates(self, mx_servers: list) -> list:
+        """竞速模式下的 (主机, 端口) 尝试顺序"""
+        return [(mx_server, port) for mx_server in mx_servers for port in self.smtp_ports]
+
+    def race_smtp(self, mx_servers: list) -> tuple:
+        """并行竞速多个MX主机与端口（类似Happy Eyeballs）
+        
+        每隔 race_stagger 秒启动下一个尝试，前一个尝试失败时立即启动下一个；
+        第一个完成EHLO的连接获胜，其余尝试被取消，整体不超过 smtp_deadline。
+        返回 (是否成功, 详情, 获胜主机, 获胜端口)
+        """
+        mx_servers = self.healthy_hosts(mx_servers)
+        if not mx_servers:
+            return False, CIRCUIT_OPEN_TEXT, None, None
+        
+        candidates = self.race_candidates(mx_servers)
+        started = time.monotonic()
+        deadline = started + self.smtp_deadline
+        cancelled = threading.Event()
+        attempts = {}  # future -> (主机, 端口, 连接对象列表)
+        pending = set()
+        error_messages = []
+        next_index = 0
+        
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    error_messages.append(f"超过整体时限{self.smtp_deadline}秒")
+                    break
+                
+                if next_index < len(candidates):
+                    mx_server, port = candidates[next_index]
+                    next_index += 1
+                    sessions = []
+                    future = self._race_pool().submit(
+                        self._race_attempt, mx_server, port,
+                        min(self.timeout, remaining), sessions, cancelled)
+                    attempts[future] = (mx_server, port, sessions)
+                    pending.add(future)
+                    wait_time = min(self.race_stagger, remaining)
+                elif pending:
+                    wait_time = remaining
+                else:
+                    break
+                
+                done, pending = concurrent.futures.wait(
+                    pending, timeout=wait_time,
+                    return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    mx_server, port, _ = attempts[future]
+                    try:
+                        details = future.result()
+                    except Exception as e:
+                        error_messages.append(f"{mx_server}: {self.describe_smtp_error(port, e)}")
+                        continue
+                    self.record_race(mx_servers, mx_server, time.monotonic() - started)
+                    return True, f"{details} 主机{mx_server}", mx_server, port
+        finally:
+            # 取消落败的尝试；shutdown可立即打断其他线程中阻塞的读取
+            cancelled.set()
+            for future in pending:
+                future.cancel()
+                for smtp in attempts[future][2]:
+                    sock = getattr(smtp, 'sock', None)
+                    if sock is not None:
+                        try:
+                            sock.shutdown(socket.SHUT_RDWR)
+                        except OSError:
+                            pass
+        
+        self.record_race(mx_servers, None, time.monotonic() - started)
+        return False, " | ".join(error_messages), None, None
+
+    def healthy_hosts(self, mx_servers: list) -> list:
+        """过滤掉熔断中的主机"""
+        if self.host_health is None:
+            return mx_servers
+        return [mx_server for mx_server in mx_servers if self.host_health.allow(mx_server)]
+
+    def record_race(self, mx_servers: list, winner: str, elapsed: float):
+        """竞速结束后更新主机健康状况：获胜主机记成功，全部失败时各主机记失败"""
+        if self.host_health is None:
+            return
+        for mx_server in mx_servers:
+            if winner is None:
+                self.host_health.record(mx_server, False, elapsed)
+            elif mx_server == winner:
+                self.host_health.record(mx_server, True, elapsed)
+            else:
+                self.host_health.abandon(mx_server)
+
+    def close(self):
+        """关闭竞速线程池与SMTP会话池"""
+        if self._race_executor is not None:
+            self._race_executor.shutdown(wait=False, cancel_futures=True)
+            self._race_executor = None
+        if self.smtp_pool is not None:
+            self.smtp_pool.close_all()
+
+    def _race_pool(self) -> concurrent.futures.ThreadPoolExecutor:
+        with self._race_lock:
+            if self._race_executor is None:
+                self._race_executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.race_workers, thread_name_prefix='smtp-race')
+            return self._race_executor
+
+    def new_result(self, email) -> EmailResult:
+        """创建空的验证结果"""
+        return EmailResult(email)
+
+    def normalize(self, email) -> str:
+        """规范化邮箱（去空白并转小写）"""
+        return str(email).strip().lower()
+
+    def precheck(self, result: EmailResult, email):
+        """基本检查与已知域名判断，无需网络即可得出结论时返回None，否则返回待验证的域名"""
+        # 基本检查
+        if not email or is_missing(email):
+            result.fail(ErrorCode.EMPTY, '邮箱为空')
+            return None
+        
+        email = self.normalize(email)
+        
+        # 格式验证
+        if not self.email_pattern.match(email):
+            result.fail(ErrorCode.BAD_FORMAT, '格式无效')
+            return None
+        
+        # 获取域名
+        domain = email.split('@')[1]
+        
+        # 检查是否是已知的有效域名
+        if domain in self.valid_domains:
+            result.status = Status.VALID
+            result.has_mx = result.smtp_valid = True
+            result.kind = ValidationType.KNOWN
+            return None
+        
+        return domain
+
+    def check_domain(self, domain: str) -> dict:
+        """对域名进行DNS与SMTP可达性验证，结论适用于该域名下的所有邮箱"""
+        if self.store is not None:
+            stored = self.store.get(domain)
+            if stored is not None:
+                return stored
+        
+        verdict = self._verify_domain(domain)
+        self.remember_verdict(domain, verdict)
+        return verdict
+
+    def check_group(self, domain: str, emails: list, verdict: dict = None) -> tuple:
+        """验证域名，启用RCPT探测时再批量探测该域名下的邮箱，返回(域名结论, {邮箱: RCPT结果})
+        
+        verdict 为之前批次已得到的结论时不再验证域名，只探测邮箱
+        """
+        self.metrics.domain_started()
+        try:
+            if verdict is None:
+                verdict = self.check_domain(domain)
+            mailboxes = {}
+            if self.rcpt_probe and verdict['smtp_valid'] and emails:
+                mailboxes = self.probe_mailboxes(verdict, emails)
+            return verdict, mailboxes
+        finally:
+            self.metrics.domain_finished()
+
+    def reusable(self, verdict: dict) -> bool:
+        """结论能否用于之后的同域名邮箱（意外错误与熔断跳过的不能）"""
+        if verdict['error_message'].startswith('验证错误'):
+            return False
+        return CIRCUIT_OPEN_TEXT not in verdict['smtp_details']
+
+    def remember_verdict(self, domain: str, verdict: dict):
+        """将网络验证得到的结论写入持久化存储（意外错误与熔断跳过的不保存）"""
+        if self.store is not None and self.reusable(verdict):
+            self.store.put(domain, verdict)
+
+    def _verify_domain(self, domain: str) -> dict:
+        """通过网络进行DNS与SMTP验证"""
+        verdict = {
             'has_mx': False,
             'smtp_valid': False,
-            'mx_records': [],
+            'mx_records': (),
             'error_message': '',
+            'error_code': ErrorCode.NONE,
             'smtp_details': '',
             'time_taken': 0,
-            'validation_type': ''
+            'smtp_host': None,
+            'smtp_port': None
         }
         
         start_time = time.time()
         
         try:
-            # 基本检查
-            if not email or pd.isna(email):
-                result['error_message'] = '邮箱为空'
-                return result
+            # 1. DNS验证
+            has_mx, mx_records = self.verify_dns(domain)
+            verdict['has_mx'] = has_mx
+            verdict['mx_records'] = tuple(mx_records)
             
-            email = str(email).strip().lower()
+            if not has_mx:
+                verdict['error_message'] = '域名MX记录不存在'
+                verdict['error_code'] = ErrorCode.NO_MX
+                return verdict
             
-            # 格式验证
-            if not re.match(self.basic_regex, email):
-                result['error_message'] = '格式无效'
-                return result
+            # 2. SMTP验证（只尝试前两个MX服务器）
+            (verdict['smtp_valid'], verdict['smtp_details'],
+             verdict['smtp_host'], verdict['smtp_port']) = self.verify_mx_servers(mx_records[:2])
             
-            # 获取域名
-            domain = email.split('@')[1]
+            if not verdict['smtp_valid']:
+                verdict['error_message'] = f"SMTP验证失败: {verdict['smtp_details']}"
+                verdict['error_code'] = ErrorCode.SMTP_FAILED
             
-            # 检查是否是已知的有效域名
-            if domain in self.valid_domains:
-                result['is_valid'] = True
-                result['has_mx'] = True
-                result['smtp_valid'] = True
-                result['validation_type'] = '已知域名'
+        except Exception as e:
+            verdict['error_message'] = f'验证错误: {str(e)}'
+            verdict['error_code'] = ErrorCode.ERROR
+        finally:
+            verdict['time_taken'] = round((time.time() - start_time) * 1000)
+        
+        return verdict
+
+    def apply_verdict(self, result: EmailResult, verdict: dict,
+                      mailboxes: dict = None) -> EmailResult:
+        """将域名级结论（及该邮箱的RCPT探测结果）写入单个邮箱的结果
+        
+        MX列表与详情字符串直接引用结论中的对象，同一域名的结果共享而不复制
+        """
+        result.kind = ValidationType.FULL
+        result.has_mx = verdict['has_mx']
+        result.smtp_valid = verdict['smtp_valid']
+        result.status = Status.VALID if verdict['smtp_valid'] else Status.INVALID
+        result.error_code = verdict['error_code']
+        result.mx_records = verdict['mx_records']
+        result.smtp_details = verdict['smtp_details']
+        result.error_message = verdict['error_message']
+        result.time_taken = verdict['time_taken']
+        
+        outcome = mailboxes.get(self.normalize(result.email)) if mailboxes else None
+        if outcome is not None:
+            code, message = outcome
+            result.smtp_details = f"{verdict['smtp_details']} | RCPT {code} {message}"
+            if 500 <= code < 600:
+                # 5xx表示邮箱不存在或被拒收；4xx等临时错误保留域名级结论
+                result.fail(ErrorCode.NO_MAILBOX, f"邮箱不存在: {code} {message}")
+        return result
+
+    def validate_email(self, email: str) -> EmailResult:
+        """验证单个邮箱"""
+        result = self.new_result(email)
+        start_time = time.time()
+        
+        try:
+            domain = self.precheck(result, email)
+            if domain is None:
                 return result
             
             # 对未知域名进行完整验证
-            result['validation_type'] = '完整验证'
-            
-            # 1. DNS验证
-            has_mx, mx_records = self.verify_dns(domain)
-            result['has_mx'] = has_mx
-            result['mx_records'] = mx_records
+            verdict, mailboxes = self.check_group(domain, [self.normalize(email)])
+            self.apply_verdict(result, verdict, mailboxes)
             
-            if not has_mx:
-                result['error_message'] = '域名MX记录不存在'
-                return result
+        except Exception as e:
+            result.fail(ErrorCode.ERROR, f'验证错误: {str(e)}')
+        finally:
+            result.time_taken = round((time.time() - start_time) * 1000)
+        
+        return result
+
+class AsyncEmailValidator(EmailValidator):
+    """基于asyncio的验证引擎，可同时保持大量DNS与SMTP探测，结果格式与EmailValidator一致"""
+
+    def __init__(self, concurrency: int = 500, per_host: int = 10, **kwargs):
+        super().__init__(**kwargs)
+        self.concurrency = concurrency  # 全局同时验证的域名数
+        self.per_host = per_host        # 每个MX主机同时进行的SMTP探测数
+        self.local_hostname = socket.getfqdn()
+        
+        # 异步DNS解析器，配置与同步解析器保持一致
+        self.async_resolver = asyncresolver.Resolver()
+        self.async_resolver.timeout = self.resolver.timeout
+        self.async_resolver.lifetime = self.resolver.lifetime
+        self.async_resolver.nameservers = list(self.resolver.nameservers)
+        
+        self._host_limits = {}   # MX主机 -> asyncio.Semaphore
+        self._dns_inflight = {}  # domain -> asyncio.Future，合并同一域名的并发查询
+
+    async def verify_dns_async(self, domain: str) -> tuple:
+        """异步验证域名DNS记录（与同步引擎共用MX缓存）"""
+        cached = self.mx_cache.get(domain)
+        if cached is not None:
+            return cached
+        
+        pending = self._dns_inflight.get(domain)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        
+        pending = asyncio.get_running_loop().create_future()
+        self._dns_inflight[domain] = pending
+        self.mx_cache.misses += 1
+        start = time.perf_counter()
+        try:
+            try:
+                if self.resolver_pool is not None:
+                    mx_records = await self.resolver_pool.resolve_async(domain, 'MX')
+                else:
+                    mx_records = await self.async_resolver.resolve(domain, 'MX')
+                mx_list = sorted([(r.preference, str(r.exchange).rstrip('.'))
+                                for r in mx_records])
+                has_mx, mx_list, ttl = True, [mx for _, mx in mx_list], mx_records.rrset.ttl
+                self.metrics.observe('dns', time.perf_counter() - start)
+            except Exception:
+                has_mx, mx_list, ttl = False, [], None
+                self.metrics.observe('dns', time.perf_counter() - start, failed=True)
+            self.mx_cache.put(domain, has_mx, mx_list, ttl)
+            pending.set_result((has_mx, list(mx_list)))
+            return has_mx, mx_list
+        finally:
+            self._dns_inflight.pop(domain, None)
+            if not pending.done():
+                pending.cancel()
+
+    def _host_limit(self, mx_server: str) -> asyncio.Semaphore:
+        limit = self._host_limits.get(mx_server)
+        if limit is None:
+            limit = self._host_limits[mx_server] = asyncio.Semaphore(self.per_host)
+        return limit
+
+    @contextlib.asynccontextmanager
+    async def _host_slot(self, mx_server: str):
+        """占用MX主机的并发名额：启用HostHealth时使用自适应上限，否则使用固定的 per_host"""
+        if self.host_health is None:
+            async with self._host_limit(mx_server):
+                yield
+            return
+        while not self.host_health.try_acquire(mx_server):
+            await asyncio.sleep(0.05)
+        try:
+            yield
+        finally:
+            self.host_health.release(mx_server)
+
+    async def _smtp_reply(self, reader) -> tuple:
+        """读取一条（可能多行的）SMTP响应"""
+        lines = []
+        while True:
+            line = await reader.readline()
+            if not line:
+                raise ConnectionResetError('连接被关闭')
+            lines.append(line.decode('utf-8', 'replace').rstrip())
+            if line[3:4] != b'-':
+                break
+        code = int(lines[-1][:3]) if lines[-1][:3].isdigit() else -1
+        return code, '\n'.join(l[4:] for l in lines)
+
+    async def _smtp_command(self, reader, writer, command: str) -> tuple:
+        writer.write(f"{command}\r\n".encode())
+        await writer.drain()
+        return await self._smtp_reply(reader)
+
+    async def _smtp_probe(self, mx_server: str, port: int):
+        """建立连接并完成EHLO，端口587尝试STARTTLS升级
+        
+        465端口的TCP连接与TLS握手在 open_connection 中一起完成，统一记入connect阶段
+        """
+        context = ssl.create_default_context() if port == 465 else None
+        with self.metrics.timer('connect', mx_server, port):
+            reader, writer = await asyncio.open_connection(mx_server, port, ssl=context)
+        try:
+            with self.metrics.timer('banner', mx_server, port):
+                code, message = await self._smtp_reply(reader)
+                if code != 220:
+                    raise smtplib.SMTPConnectError(code, message)
+            with self.metrics.timer('ehlo', mx_server, port):
+                await self._smtp_command(reader, writer, f"EHLO {self.local_hostname}")
             
-            # 2. SMTP验证（尝试多个MX服务器）
-            for mx_server in mx_records[:2]:  # 只尝试前两个MX服务器
-                smtp_valid, smtp_details = self.verify_smtp(mx_server)
-                if smtp_valid:
-                    result['smtp_valid'] = True
-                    result['smtp_details'] = smtp_details
-                    result['is_valid'] = True
+            # 如果服务器支持STARTTLS，尝试升级到TLS
+            if port == 587:
+                try:
+                    with self.metrics.timer('tls', mx_server, port):
+                        code, _ = await self._smtp_command(reader, writer, 'STARTTLS')
+                        if code == 220:
+                            await writer.start_tls(ssl.create_default_context())
+                    if code == 220:
+                        with self.metrics.timer('ehlo', mx_server, port):
+                            await self._smtp_command(reader, writer, f"EHLO {self.local_hostname}")
+                except Exception:
+                    pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    async def _smtp_attempt_async(self, mx_server: str, port: int, timeout: float) -> str:
+        """在单个端口上完成一次异步探测，成功返回详情，失败抛出异常"""
+        async with self._host_slot(mx_server):
+            await asyncio.wait_for(self._smtp_probe(mx_server, port), timeout)
+        if port == 465:
+            return f"SSL连接成功(端口{port})"
+        return f"连接成功(端口{port})"
+
+    async def _verify_smtp_ports_async(self, mx_server: str) -> tuple:
+        """异步版本的_verify_smtp_ports"""
+        health = self.host_health
+        if health is not None and not health.allow(mx_server):
+            return False, CIRCUIT_OPEN_TEXT, None
+        
+        error_messages = []
+        start = time.monotonic()
+        
+        for port in self.smtp_ports:
+            try:
+                details = await self._smtp_attempt_async(mx_server, port, self.timeout)
+            except Exception as e:
+                error_messages.append(self.describe_smtp_error(port, e))
+                continue
+            if health is not None:
+                health.record(mx_server, True, time.monotonic() - start)
+            return True, details, port
+        
+        if health is not None:
+            health.record(mx_server, False, time.monotonic() - start)
+        return False, " | ".join(error_messages), None
+
+    async def verify_smtp_async(self, mx_server: str) -> tuple:
+        """异步验证SMTP连接，尝试多个端口"""
+        smtp_valid, details, _ = await self._verify_smtp_ports_async(mx_server)
+        return smtp_valid, details
+
+    async def verify_mx_servers_async(self, mx_servers: list) -> tuple:
+        """异步版本的verify_mx_servers"""
+        if self.smtp_race:
+            return await self.race_smtp_async(mx_servers)
+        
+        smtp_details = ''
+        for mx_server in mx_servers:
+            smtp_valid, details, port = await self._verify_smtp_ports_async(mx_server)
+            if smtp_valid:
+                return True, details, mx_server, port
+            smtp_details = f"{mx_server}: {details}"
+        return False, smtp_details, None, None
+
+    async def race_smtp_async(self, mx_servers: list) -> tuple:
+        """异步版本的race_smtp，落败的尝试直接取消"""
+        mx_servers = self.healthy_hosts(mx_servers)
+        if not mx_servers:
+            return False, CIRCUIT_OPEN_TEXT, None, None
+        
+        candidates = self.race_candidates(mx_servers)
+        started = time.monotonic()
+        deadline = started + self.smtp_deadline
+        attempts = {}  # task -> (主机, 端口)
+        pending = set()
+        error_messages = []
+        next_index = 0
+        
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    error_messages.append(f"超过整体时限{self.smtp_deadline}秒")
                     break
+                
+                if next_index < len(candidates):
+                    mx_server, port = candidates[next_index]
+                    next_index += 1
+                    task = asyncio.ensure_future(self._smtp_attempt_async(
+                        mx_server, port, min(self.timeout, remaining)))
+                    attempts[task] = (mx_server, port)
+                    pending.add(task)
+                    wait_time = min(self.race_stagger, remaining)
+                elif pending:
+                    wait_time = remaining
                 else:
-                    result['smtp_details'] = f"{mx_server}: {smtp_details}"
+                    break
+                
+                done, pending = await asyncio.wait(
+                    pending, timeout=wait_time, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    mx_server, port = attempts[task]
+                    try:
+                        details = task.result()
+                    except Exception as e:
+                        error_messages.append(f"{mx_server}: {self.describe_smtp_error(port, e)}")
+                        continue
+                    self.record_race(mx_servers, mx_server, time.monotonic() - started)
+                    return True, f"{details} 主机{mx_server}", mx_server, port
+        finally:
+            # 取消落败的尝试
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        
+        self.record_race(mx_servers, None, time.monotonic() - started)
+        return False, " | ".join(error_messages), None, None
+
+    async def check_domain_async(self, domain: str) -> dict:
+        """异步版本的check_domain"""
+        if self.store is not None:
+            stored = self.store.get(domain)
+            if stored is not None:
+                return stored
+        
+        verdict = await self._verify_domain_async(domain)
+        self.remember_verdict(domain, verdict)
+        return verdict
+
+    async def check_group_async(self, domain: str, emails: list, verdict: dict = None) -> tuple:
+        """异步版本的check_group，RCPT探测在线程中使用同步会话池完成"""
+        self.metrics.domain_started()
+        try:
+            if verdict is None:
+                verdict = await self.check_domain_async(domain)
+            mailboxes = {}
+            if self.rcpt_probe and verdict['smtp_valid'] and emails:
+                async with self._host_slot(verdict.get('smtp_host') or verdict['mx_records'][0]):
+                    mailboxes = await asyncio.to_thread(self.probe_mailboxes, verdict, emails)
+            return verdict, mailboxes
+        finally:
+            self.metrics.domain_finished()
+
+    async def _verify_domain_async(self, domain: str) -> dict:
+        """异步版本的_verify_domain"""
+        verdict = {
+            'has_mx': False,
+            'smtp_valid': False,
+            'mx_records': (),
+            'error_message': '',
+            'error_code': ErrorCode.NONE,
+            'smtp_details': '',
+            'time_taken': 0,
+            'smtp_host': None,
+            'smtp_port': None
+        }
+        
+        start_time = time.time()
+        
+        try:
+            has_mx, mx_records = await self.verify_dns_async(domain)
+            verdict['has_mx'] = has_mx
+            verdict['mx_records'] = tuple(mx_records)
             
-            if not result['smtp_valid']:
-                result['error_message'] = f"SMTP验证失败: {result['smtp_details']}"
+            if not has_mx:
+                verdict['error_message'] = '域名MX记录不存在'
+                verdict['error_code'] = ErrorCode.NO_MX
+                return verdict
+            
+            (verdict['smtp_valid'], verdict['smtp_details'],
+             verdict['smtp_host'], verdict['smtp_port']) = await self.verify_mx_servers_async(mx_records[:2])
+            
+            if not verdict['smtp_valid']:
+                verdict['error_message'] = f"SMTP验证失败: {verdict['smtp_details']}"
+                verdict['error_code'] = ErrorCode.SMTP_FAILED
             
         except Exception as e:
-            result['error_message'] = f'验证错误: {str(e)}'
+            verdict['error_message'] = f'验证错误: {str(e)}'
+            verdict['error_code'] = ErrorCode.ERROR
         finally:
-            result['time_taken'] = round((time.time() - start_time) * 1000)
+            verdict['time_taken'] = round((time.time() - start_time) * 1000)
+        
+        return verdict
+
+    async def validate_email_async(self, email: str) -> EmailResult:
+        """异步验证单个邮箱"""
+        result = self.new_result(email)
+        start_time = time.time()
+        
+        try:
+            domain = self.precheck(result, email)
+            if domain is None:
+                return result
+            verdict, mailboxes = await self.check_group_async(domain, [self.normalize(email)])
+            self.apply_verdict(result, verdict, mailboxes)
+        except Exception as e:
+            result.fail(ErrorCode.ERROR, f'验证错误: {str(e)}')
+        finally:
+            result.time_taken = round((time.time() - start_time) * 1000)
         
         return result
 
+    async def check_domains(self, domains, on_verdict, emails_of=None, verdicts=None):
+        """以全局并发上限验证一批域名，每完成一个调用 on_verdict(domain, verdict, mailboxes)
+        
+        emails_of(domain) 返回该域名下需要RCPT探测的邮箱；verdicts 中已有结论的域名不再验证
+        """
+        # 信号量与查询中的Future绑定创建它们的事件循环，每批（每次asyncio.run）重新创建
+        self._host_limits = {}
+        self._dns_inflight = {}
+        pending = iter(domains)
+        
+        async def worker():
+            for domain in pending:
+                emails = emails_of(domain) if emails_of else []
+                known = verdicts.get(domain) if verdicts else None
+                verdict, mailboxes = await self.check_group_async(domain, emails, known)
+                on_verdict(domain, verdict, mailboxes)
+        
+        await asyncio.gather(*(worker() for _ in range(max(1, self.concurrency))))
+
 def format_log_message(result):
     """格式化日志消息"""
     # 基本信息行
     base_info = "{:<30} {:<10} {:<6} {:<6} {:<6}".format(
-        result['email'][:30],
+        str(result['email'])[:30],
         '✓ 有效' if result['is_valid'] else '✗ 无效',
         '✓' if result['has_mx'] else '✗',
         '✓' if result['smtp_valid'] else '✗',
@@ -197,76 +2031,624 @@ def format_log_message(result):
         return f"{base_info}\n    " + "\n    ".join(details) + "\n"
     return base_info
 
-def process_file(input_file: str, max_workers: int = 10):
-    """处理CSV文件"""
-    start_time = time.time()
-    logging.info(f"开始处理文件: {input_file}")
+class ResultLogSink:
+    """结果日志的后台输出：结果循环只把结果放入队列，格式化与写入都在后台线程完成
     
+    quiet=True 时不再逐条输出，改为每隔 progress_interval 秒输出一行进度；
+    指定 detail_file 时每条结果以一行JSON写入该文件。
+    """
+
+    def __init__(self, quiet: bool = False, detail_file: str = None,
+                 progress_interval: float = 10, progress=None):
+        self.quiet = quiet
+        self.detail_file = detail_file
+        self.progress_interval = progress_interval
+        self.progress = progress  # 返回(已处理数, 总数)的函数
+        self._queue = queue.SimpleQueue()
+        self._detail = None
+        self._thread = threading.Thread(target=self._run, name='result-log', daemon=True)
+
+    def start(self):
+        if self.detail_file:
+            self._detail = open(self.detail_file, 'a', encoding='utf-8')
+        self._started_at = time.time()
+        self._thread.start()
+        return self
+
+    def submit(self, result: dict, row: int = None):
+        """放入一条结果（调用方之后不应再修改该结果）"""
+        self._queue.put((row, result))
+
+    def submit_frame(self, frame):
+        """放入预筛选得到的一批结果（只写入明细日志，不逐条输出）"""
+        if self._detail is not None and len(frame):
+            self._queue.put(frame)
+
+    def _run(self):
+        next_progress = time.time() + self.progress_interval
+        while True:
+            timeout = max(next_progress - time.time(), 0) if self.quiet else None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = ()  # 超时，只检查是否需要输出进度
+            if item is None:
+                break
+            try:
+                self._handle(item)
+            except Exception as e:
+                logging.error(f"输出结果日志失败: {str(e)}")
+            if self.quiet and time.time() >= next_progress:
+                self.log_progress()
+                next_progress = time.time() + self.progress_interval
+
+    def _handle(self, item):
+        if isinstance(item, tuple):
+            if not item:
+                return
+            row, result = item
+            if not self.quiet:
+                logging.info(format_log_message(result))
+            if self._detail is not None:
+                self._detail.write(self.detail_line(result, row) + '\n')
+            return
+        for row, result in zip(item.index, item.to_dict('records')):
+            self._detail.write(self.detail_line(result, int(row)) + '\n')
+
+    @staticmethod
+    def detail_line(result: dict, row: int = None) -> str:
+        """一条结果的JSON明细"""
+        email = result.get('email')
+        return json.dumps({
+            'row': row,
+            'email': None if is_missing(email) else str(email),
+            'is_valid': bool(result.get('is_valid')),
+            'has_mx': bool(result.get('has_mx')),
+            'smtp_valid': bool(result.get('smtp_valid')),
+            'mx_records': list(result.get('mx_records') or []),
+            'validation_type': result.get('validation_type', ''),
+            'error_code': int(result.get('error_code') or 0),
+            'smtp_details': result.get('smtp_details', ''),
+            'error_message': result.get('error_message', ''),
+            'time_ms': int(result.get('time_taken') or 0),
+        }, ensure_ascii=False)
+
+    def log_progress(self):
+        """输出一行进度：已处理数、百分比与平均速度"""
+        processed, total = self.progress() if self.progress else (0, None)
+        rate = processed / max(time.time() - self._started_at, 1e-9)
+        percent = f" ({processed / total * 100:.1f}%)" if total else ''
+        logging.info(f"处理进度: {processed}/{total or '?'}{percent}，{rate:.1f} 封/秒")
+
+    def close(self):
+        """输出队列中剩余的结果后停止"""
+        self._queue.put(None)
+        self._thread.join()
+        if self._detail is not None:
+            self._detail.close()
+            self._detail = None
+
+# 写回CSV的结果列
+RESULT_COLUMNS = ['valid_format', 'has_mx', 'smtp_valid', 'mx_servers', 
+                  'error_message', 'smtp_details', 'validation_time_ms', 
+                  'validation_type']
+
+def plan_batches(emails, validator: EmailValidator, skip: set = None) -> tuple:
+    """向量化预筛选并按域名分组，skip 中的行号（已有结果）不再处理
+    
+    对整列一次性完成去空白/小写、格式检查与已知域名判断并直接填好这些行的结果，
+    只有未知域名的行才按域名分组交给网络验证。
+    返回 (预筛选结果 DataFrame（索引为行号）, {域名: [(行号, 结果)]})
+    """
+    if skip:
+        emails = emails[~emails.index.isin(skip)]
+    
+    raw = emails.astype(str)
+    normalized = raw.str.strip().str.lower()
+    blank = emails.isna() | (raw == '')
+    valid_format = ~blank & normalized.str.match(validator.email_pattern).fillna(False).astype(bool)
+    domains = normalized.str.split('@', n=1).str[1]
+    known = valid_format & domains.isin(validator.valid_domains)
+    pending = valid_format & ~known
+    done = ~pending
+    
+    # 无需网络即可得出结论的行
+    ready = pd.DataFrame(index=emails.index[done])
+    ready['email'] = emails[done]
+    ready['is_valid'] = known[done]
+    ready['has_mx'] = known[done]
+    ready['smtp_valid'] = known[done]
+    ready['error_message'] = ''
+    ready.loc[blank[done], 'error_message'] = '邮箱为空'
+    ready.loc[~valid_format[done] & ~blank[done], 'error_message'] = '格式无效'
+    ready['smtp_details'] = ''
+    ready['validation_type'] = known[done].map({True: '已知域名', False: ''})
+    ready['error_code'] = int(ErrorCode.NONE)
+    ready.loc[blank[done], 'error_code'] = int(ErrorCode.EMPTY)
+    ready.loc[~valid_format[done] & ~blank[done], 'error_code'] = int(ErrorCode.BAD_FORMAT)
+    ready['time_taken'] = 0
+    ready['validation_time_ms'] = 0
+    
+    # 未知域名按域名分组
+    groups = {}
+    for idx, email, domain in zip(emails.index[pending], emails[pending], domains[pending]):
+        groups.setdefault(domain, []).append((idx, validator.new_result(email)))
+    return ready, groups
+
+def log_prefiltered(ready):
+    """汇总输出预筛选结果"""
+    if len(ready):
+        known = int((ready['validation_type'] == '已知域名').sum())
+        empty = int((ready['error_message'] == '邮箱为空').sum())
+        logging.info(f"预筛选完成 {len(ready)} 行（已知域名 {known}，格式无效 {len(ready) - known - empty}，"
+                     f"空邮箱 {empty}），其余交给网络验证")
+
+def dispatch_batches(validator: EmailValidator, groups: dict,
+                     on_result, max_workers: int = 10, verdicts: dict = None):
+    """按域名派发网络验证；每得到一行结果调用 on_result(行号, 结果)
+    
+    verdicts 为跨批次共享的 {域名: 结论}：已有结论的域名不再验证（启用RCPT探测时仍探测新邮箱），
+    新得到的可复用结论会加入其中
+    """
+    def emails_of(domain):
+        if not validator.rcpt_probe:
+            return []
+        return [validator.normalize(result['email']) for _, result in groups[domain]]
+    
+    def record_verdict(domain, verdict, mailboxes):
+        if verdicts is not None and domain not in verdicts and validator.reusable(verdict):
+            verdicts[domain] = verdict
+        try:
+            for idx, result in groups[domain]:
+                on_result(idx, validator.apply_verdict(result, verdict, mailboxes))
+        except Exception as e:
+            logging.error(f"处理错误: {str(e)}")
+    
+    if verdicts and not validator.rcpt_probe:
+        # 不需要探测邮箱时，之前批次验证过的域名直接套用结论，不再派发
+        for domain in [domain for domain in groups if domain in verdicts]:
+            record_verdict(domain, verdicts[domain], {})
+        groups = {domain: rows for domain, rows in groups.items() if domain not in verdicts}
+    
+    if isinstance(validator, AsyncEmailValidator):
+        asyncio.run(validator.check_domains(groups, record_verdict, emails_of, verdicts))
+        return
+    
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(validator.check_group, domain, emails_of(domain),
+                                   verdicts.get(domain) if verdicts else None): domain
+                  for domain in groups}
+        
+        for future in concurrent.futures.as_completed(futures):
+            domain = futures[future]
+            try:
+                verdict, mailboxes = future.result()
+            except Exception as e:
+                logging.error(f"处理错误: {str(e)}")
+                continue
+            record_verdict(domain, verdict, mailboxes)
+
+class RunStats:
+    """统计验证结果并输出日志"""
+
+    def __init__(self, total: int = None, sink: ResultLogSink = None):
+        self.total = total
+        self.processed = 0
+        self.valid_count = 0
+        self.known_domain_count = 0
+        self.sink = sink  # 结果日志输出，为None时不输出逐条结果
+
+    @property
+    def quiet(self) -> bool:
+        return self.sink is not None and self.sink.quiet
+
+    def record(self, result: dict, log: bool = True, row: int = None):
+        self.processed += 1
+        if result['is_valid']:
+            self.valid_count += 1
+        if result['validation_type'] == '已知域名':
+            self.known_domain_count += 1
+        
+        # 交给后台线程输出验证结果
+        if log and self.sink is not None:
+            self.sink.submit(result, row)
+
+    def record_frame(self, frame):
+        """批量计入预筛选得到的结果"""
+        self.processed += len(frame)
+        self.valid_count += int(frame['is_valid'].sum())
+        self.known_domain_count += int((frame['validation_type'] == '已知域名').sum())
+        if self.sink is not None:
+            self.sink.submit_frame(frame)
+
+    def log_progress(self):
+        # 安静模式下由结果日志线程定期输出进度
+        if self.quiet:
+            return
+        if self.total:
+            progress = f"\n处理进度: {self.processed}/{self.total} ({self.processed/self.total*100:.1f}%)"
+        else:
+            progress = f"\n处理进度: 已处理 {self.processed}"
+        logging.info(f"{'-'*60}\n{progress}\n{'-'*60}\n")
+
+def journal_key(email) -> str:
+    """结果日志中用于核对行内容的邮箱原值（去掉换行）"""
+    if is_missing(email):
+        return ''
+    return str(email).replace('\r', ' ').replace('\n', ' ')
+
+class ResultJournal:
+    """追加写入的结果日志（行号、邮箱与结果列），用于流式输出与断点续跑
+    
+    已写入的内容不再改写；每 sync_every 条结果落盘一次（fsync），
+    进程崩溃时写了一半的末行会在下次加载时被截掉。
+    """
+
+    def __init__(self, path: str, fields: list, sync_every: int = 100):
+        self.path = path
+        self.fields = fields
+        self.columns = ['row', 'email', 'is_valid'] + fields
+        self.sync_every = sync_every
+        self.file = None
+        self.writer = None
+        self._unsynced = 0
+
+    def load(self) -> dict:
+        """读取已完成的结果，返回 {行号: (邮箱, 是否有效, 验证类型)}，并截掉不完整的末行
+        
+        逐行读取，只保留续跑判断与统计需要的字段；结果列由 restore 再按需读取
+        """
+        completed = {}
+        if not os.path.exists(self.path):
+            return completed
+        self._truncate_partial()
+        
+        kind = self.columns.index('validation_type') if 'validation_type' in self.columns else None
+        for idx, row in self.rows():
+            completed[idx] = (row[1], row[2] == 'True', sys.intern(row[kind]) if kind is not None else '')
+        return completed
+
+    def restore(self, df, rows: set):
+        """将结果日志中 rows 各行的结果列写回 df"""
+        if not rows:
+            return
+        for idx, row in self.rows():
+            if idx in rows:
+                for field, value in zip(self.fields, row[3:]):
+                    df.at[idx, field] = value
+
+    def rows(self):
+        """逐行读取结果日志，产生 (行号, 各列)；格式不匹配时删除该文件"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, newline='', encoding='utf-8', errors='replace') as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header != self.columns:
+                if header is not None:
+                    logging.warning(f"结果日志格式不匹配，忽略已有内容: {self.path}")
+                    f.close()
+                    os.remove(self.path)
+                return
+            for row in reader:
+                if len(row) == len(self.columns) and row[0].isdigit():
+                    yield int(row[0]), row
+
+    def _truncate_partial(self):
+        """截掉进程崩溃时写了一半的末行"""
+        with open(self.path, 'rb+') as f:
+            end = f.seek(0, os.SEEK_END)
+            size = end
+            # 从文件末尾向前找最后一个换行
+            while end > 0:
+                start = max(0, end - 65536)
+                f.seek(start)
+                block = f.read(end - start)
+                newline = block.rfind(b'\n')
+                if newline >= 0:
+                    end = start + newline + 1
+                    break
+                end = start
+            if end < size:
+                f.truncate(end)
+                logging.warning(f"结果日志末行不完整，已截断: {self.path}")
+
+    def open(self):
+        is_new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self.file = open(self.path, 'a', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        if is_new:
+            self.writer.writerow(self.columns)
+            self.sync()
+        return self
+
+    def write(self, idx: int, result: dict):
+        values = [result['is_valid']] + [result[field] for field in self.fields]
+        # 去掉换行，保证每条结果正好占一行
+        values = [str(v).replace('\r', ' ').replace('\n', ' ') for v in values]
+        self.writer.writerow([idx, journal_key(result['email'])] + values)
+        self._unsynced += 1
+        if self._unsynced >= self.sync_every:
+            self.sync()
+
+    def write_frame(self, frame):
+        """批量写入预筛选得到的结果"""
+        self.writer.writerows(zip(frame.index, frame['email'].map(journal_key), frame['is_valid'],
+                                  *(frame[field] for field in self.fields)))
+        self._unsynced += len(frame)
+        if self._unsynced >= self.sync_every:
+            self.sync()
+
+    def sync(self):
+        """刷新缓冲并落盘"""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self._unsynced = 0
+
+    def close(self):
+        if self.file is not None:
+            self.sync()
+            self.file.close()
+            self.file = None
+
+    def remove(self):
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+def sorted_runs(results_file: str, fields: list, chunk_size: int) -> list:
+    """将结果日志分块按行号排序（块内同一行保留最后一条），各写入一个临时文件，返回路径列表"""
+    paths = []
+    for chunk in pd.read_csv(results_file, usecols=['row'] + fields, keep_default_na=False,
+                             dtype={field: str for field in fields}, chunksize=chunk_size):
+        chunk = chunk[~chunk['row'].duplicated(keep='last')].sort_values('row')
+        path = f"{results_file}.run-{len(paths)}"
+        chunk[['row'] + fields].to_csv(path, index=False)
+        paths.append(path)
+    return paths
+
+def read_run(path: str, order: int):
+    """逐行读取一个已排序的临时文件，产生 (行号, 文件序号, 结果列)"""
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for row in reader:
+            yield int(row[0]), order, row[1:]
+
+def merge_results(input_file: str, results_file: str, fields: list, chunk_size: int = 50000):
+    """将追加写入的结果按行号合并回原始列布局，结束时执行一次
+    
+    结果日志先分块排序，再多路归并并与原文件的各块同步推进，内存占用与文件大小无关；
+    同一行有多条结果时以后写入的为准。
+    """
+    paths = sorted_runs(results_file, fields, chunk_size)
     try:
-        # 读取CSV文件
-        df = pd.read_csv(input_file)
-        total_emails = len(df)
-        processed = 0
-        valid_count = 0
-        known_domain_count = 0
+        merged = heapq.merge(*(read_run(path, order) for order, path in enumerate(paths)))
+        ahead = next(merged, None)
         
-        logging.info(f"总共需要处理 {total_emails} 个邮箱\n")
+        def results_of(chunk):
+            """取出行号不超过该块末行的结果"""
+            nonlocal ahead
+            rows = {}
+            last = chunk.index[-1] if len(chunk) else -1
+            while ahead is not None and ahead[0] <= last:
+                rows[ahead[0]] = ahead[2]
+                ahead = next(merged, None)
+            return pd.DataFrame.from_dict(rows, orient='index', columns=fields)
         
-        # 创建或更新结果列
-        columns = ['valid_format', 'has_mx', 'smtp_valid', 'mx_servers', 
-                  'error_message', 'smtp_details', 'validation_time_ms', 
-                  'validation_type']
-        for col in columns:
-            if col not in df.columns:
-                df[col] = ''
+        merge_chunks(input_file, results_of, fields, chunk_size)
+    finally:
+        for path in paths:
+            os.remove(path)
+
+def save_frame(df, path: str):
+    """写入临时文件后原子替换，写入中途崩溃不会截断原文件"""
+    temp_file = f"{path}.saving"
+    df.to_csv(temp_file, index=False)
+    os.replace(temp_file, path)
+
+def merge_frame(input_file: str, results, fields: list, chunk_size: int = 50000):
+    """按行号（results的索引）将结果列写回原文件，分块重写后原子替换"""
+    merge_chunks(input_file, lambda chunk: results, fields, chunk_size)
+
+def merge_chunks(input_file: str, results_of, fields: list, chunk_size: int = 50000):
+    """分块重写原文件后原子替换，results_of(块) 返回含该块结果的 DataFrame（索引为行号）"""
+    temp_file = f"{input_file}.merging"
+    written = False
+    for chunk in pd.read_csv(input_file, chunksize=chunk_size):
+        for col in RESULT_COLUMNS:
+            if col not in chunk.columns:
+                chunk[col] = ''
+        results = results_of(chunk)
+        rows = chunk.index.intersection(results.index)
+        for field in fields:
+            chunk[field] = chunk[field].astype(object)
+            chunk.loc[rows, field] = results.loc[rows, field].values
+        chunk.to_csv(temp_file, mode='a' if written else 'w', header=not written, index=False)
+        written = True
+    
+    if written:
+        os.replace(temp_file, input_file)
+
+def resume_rows(emails, completed: dict, stats: RunStats) -> set:
+    """找出结果日志中已完成且邮箱未变化的行，计入统计并返回其行号"""
+    skip = set()
+    if not completed:
+        return skip
+    for idx, email in emails.items():
+        entry = completed.get(idx)
+        if entry is not None and entry[0] == journal_key(email):
+            stats.record({'is_valid': entry[1], 'validation_type': entry[2]}, log=False)
+            skip.add(idx)
+    return skip
+
+def _process_in_memory(input_file: str, validator: EmailValidator, max_workers: int,
+                       journal: ResultJournal, stats: RunStats):
+    """整表读入内存处理，每100条结果重写一次原文件，结果同时写入结果日志"""
+    # 读取CSV文件
+    df = pd.read_csv(input_file)
+    stats.total = len(df)
+    
+    # 创建或更新结果列（已有的列转为object，避免重复运行时写入字符串与数值列类型冲突）
+    for col in RESULT_COLUMNS:
+        if col not in df.columns:
+            df[col] = ''
+        else:
+            df[col] = df[col].astype(object)
+    
+    # 恢复上次中断前已完成的结果
+    completed = journal.load()
+    skip = resume_rows(df['email'], completed, stats)
+    journal.restore(df, skip)
+    if skip:
+        logging.info(f"从结果日志恢复 {len(skip)} 条已完成的结果")
+    
+    logging.info(f"总共需要处理 {stats.total - len(skip)} 个邮箱\n")
+    
+    # 打印表头
+    if not stats.quiet:
+        log_table_header()
+    
+    with journal:
+        def record_result(idx, result):
+            """写回结果到原始行并更新统计"""
+            for col in RESULT_COLUMNS:
+                if col in result:
+                    df.at[idx, col] = result[col]
+            journal.write(idx, result)
+            stats.record(result, row=idx)
+            
+            # 每处理100个邮箱保存一次并显示进度
+            if stats.processed % 100 == 0:
+                save_frame(df, input_file)
+                stats.log_progress()
         
-        # 打印表头
-        logging.info("{:<30} {:<10} {:<6} {:<6} {:<6}".format(
-            '邮箱', '结果', 'MX', 'SMTP', '耗时'
-        ))
-        logging.info("-" * 60)
+        # 向量化预筛选，结果直接填入（中断后重新预筛选即可，无需写入结果日志）
+        ready, groups = plan_batches(df['email'], validator, skip=skip)
+        for col in RESULT_COLUMNS:
+            if col in ready.columns:
+                df.loc[ready.index, col] = ready[col]
+        stats.record_frame(ready)
+        log_prefiltered(ready)
         
+        # 按域名分组，每个域名只进行一次DNS与SMTP验证
+        dispatch_batches(validator, groups, record_result, max_workers)
+    
+    # 保存最终结果
+    save_frame(df, input_file)
+    journal.remove()
+
+def _process_stream(input_file: str, validator: EmailValidator, max_workers: int,
+                    chunk_size: int, journal: ResultJournal, stats: RunStats):
+    """分块读取email列，结果追加写入结果日志，最后一次性合并回原文件"""
+    completed = journal.load()
+    if completed:
+        logging.info(f"结果日志中已有 {len(completed)} 条结果，将跳过对应的行")
+    
+    logging.info(f"流式处理，每块 {chunk_size} 行，结果追加写入: {journal.path}\n")
+    if not stats.quiet:
+        log_table_header()
+    
+    with journal:
+        def record_result(idx, result):
+            journal.write(idx, result)
+            stats.record(result, row=idx)
+            if stats.processed % 100 == 0:
+                stats.log_progress()
+        
+        # 域名分组在块内进行，已验证域名的结论跨块沿用，每个域名只验证一次
+        verdicts = {}
+        # 各块的索引延续上一块，即为原文件中的行号
+        for chunk in pd.read_csv(input_file, usecols=['email'], chunksize=chunk_size):
+            skip = resume_rows(chunk['email'], completed, stats)
+            ready, groups = plan_batches(chunk['email'], validator, skip=skip)
+            journal.write_frame(ready)
+            stats.record_frame(ready)
+            log_prefiltered(ready)
+            dispatch_batches(validator, groups, record_result, max_workers, verdicts)
+    
+    logging.info("正在合并结果到原文件...")
+    merge_results(input_file, journal.path, journal.fields, chunk_size)
+    journal.remove()
+    stats.total = stats.processed
+
+def log_table_header():
+    """打印结果表头"""
+    logging.info("{:<30} {:<10} {:<6} {:<6} {:<6}".format(
+        '邮箱', '结果', 'MX', 'SMTP', '耗时'
+    ))
+    logging.info("-" * 60)
+
+def process_file(input_file: str, max_workers: int = 10, validator: EmailValidator = None,
+                 stream: bool = False, chunk_size: int = 50000, results_file: str = None,
+                 resume: bool = True, metrics_file: str = None, metrics_format: str = 'json',
+                 metrics_interval: float = 10, quiet: bool = False, detail_log: str = None,
+                 progress_interval: float = 10):
+    """处理CSV文件
+    
+    传入AsyncEmailValidator时使用异步引擎；stream=True 时分块读取并追加写入结果，
+    内存占用与文件大小无关，结束时一次性合并回原文件。
+    结果同时写入结果日志（默认 <输入文件>.results.csv），运行中断后再次执行会跳过已完成的行，
+    resume=False 时丢弃已有的结果日志重新验证。
+    指定 metrics_file 时每隔 metrics_interval 秒写入一次分阶段耗时快照（json 或 prometheus）。
+    逐条结果由后台线程输出；quiet=True 时只每隔 progress_interval 秒输出一行进度，
+    detail_log 指定时每条结果以JSON行写入该文件。
+    """
+    start_time = time.time()
+    logging.info(f"开始处理文件: {input_file}")
+    
+    try:
         # 初始化验证器
-        validator = EmailValidator()
+        if validator is None:
+            validator = EmailValidator()
         
-        # 处理每个邮箱
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = {executor.submit(validator.validate_email, email): idx 
-                      for idx, email in enumerate(df['email'])}
-            
-            for future in concurrent.futures.as_completed(futures):
-                idx = futures[future]
-                try:
-                    result = future.result()
-                    
-                    # 更新DataFrame
-                    for col in columns:
-                        if col in result:
-                            df.at[idx, col] = result[col]
-                    
-                    processed += 1
-                    if result['is_valid']:
-                        valid_count += 1
-                    if result['validation_type'] == '已知域名':
-                        known_domain_count += 1
-                    
-                    # 显示验证结果
-                    logging.info(format_log_message(result))
-                    
-                    # 每处理100个邮箱保存一次并显示进度
-                    if processed % 100 == 0:
-                        df.to_csv(input_file, index=False)
-                        progress = f"\n处理进度: {processed}/{total_emails} ({processed/total_emails*100:.1f}%)"
-                        logging.info(f"{'-'*60}\n{progress}\n{'-'*60}\n")
-                    
-                except Exception as e:
-                    logging.error(f"处理错误: {str(e)}")
+        fields = [col for col in RESULT_COLUMNS if col in validator.new_result('')]
+        journal = ResultJournal(results_file or f"{input_file}.results.csv", fields)
+        if not resume:
+            journal.remove()
         
-        # 保存最终结果
-        df.to_csv(input_file, index=False)
+        stats = RunStats()
+        stats.sink = ResultLogSink(quiet=quiet, detail_file=detail_log,
+                                   progress_interval=progress_interval,
+                                   progress=lambda: (stats.processed, stats.total)).start()
+        reporter = None
+        if metrics_file:
+            reporter = MetricsReporter(validator.metrics, metrics_file, metrics_format,
+                                       metrics_interval, progress=lambda: stats.processed).start()
+        try:
+            if stream:
+                _process_stream(input_file, validator, max_workers, chunk_size, journal, stats)
+            else:
+                _process_in_memory(input_file, validator, max_workers, journal, stats)
+        finally:
+            if reporter is not None:
+                reporter.stop()
+            stats.sink.close()
         
         # 打印统计信息
+        total_emails = stats.total
+        valid_count = stats.valid_count
+        known_domain_count = stats.known_domain_count
         total_time = time.time() - start_time
+        cache_stats = validator.mx_cache.stats()
+        store_line = ''
+        if validator.store is not None:
+            store_line = f"- 域名结论库: 命中 {validator.store.hits} / 新写入 {validator.store.writes}\n"
+        if validator.smtp_pool is not None:
+            store_line += f"- SMTP会话: 新建 {validator.smtp_pool.opened} / 复用 {validator.smtp_pool.reused}\n"
+        if validator.host_health is not None:
+            health = validator.host_health
+            store_line += (f"- 主机熔断: 打开 {health.opened} 次 / 快速失败 {health.rejected} 次 / "
+                           f"当前熔断 {health.open_hosts()} 个主机\n")
+        if validator.resolver_pool is not None:
+            store_line += ''.join(line + '\n' for line in validator.resolver_pool.summary_lines())
+        stage_lines = ''.join(line + '\n' for line in validator.metrics.summary_lines())
         logging.info(f"""
 {'='*60}
 验证完成:
@@ -275,10 +2657,11 @@ def process_file(input_file: str, max_workers: int = 10):
 - 无效邮箱数: {total_emails - valid_count}
 - 已知域名数: {known_domain_count}
 - 需完整验证: {total_emails - known_domain_count}
-- 有效率: {(valid_count/total_emails*100):.1f}%
+- 有效率: {(valid_count/max(total_emails, 1)*100):.1f}%
 - 总耗时: {total_time:.1f}秒
-- 平均速度: {(total_time/total_emails*1000):.1f}毫秒/封
-- 结果已保存到: {input_file}
+- 平均速度: {(total_time/max(total_emails, 1)*1000):.1f}毫秒/封
+- MX缓存: 命中 {cache_stats['hits']} (负缓存 {cache_stats['negative_hits']}) / 未命中 {cache_stats['misses']}
+{store_line}{stage_lines}- 结果已保存到: {input_file}
 {'='*60}
         """)
         
@@ -286,10 +2669,356 @@ def process_file(input_file: str, max_workers: int = 10):
         logging.error(f"处理过程发生错误: {str(e)}")
         raise
 
-if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("使用方法: python validator.py input.csv")
-        sys.exit(1)
+def warm_store(input_file: str, validator: EmailValidator, max_workers: int = 10,
+               chunk_size: int = 50000):
+    """验证文件中所有未知域名并写入结论库，不修改输入文件"""
+    logging.info(f"开始预热域名结论库: {validator.store.path}")
+    seen = set()
+    for chunk in pd.read_csv(input_file, usecols=['email'], chunksize=chunk_size):
+        _, groups = plan_batches(chunk['email'], validator)
+        groups = {domain: [] for domain in groups if domain not in seen}
+        seen.update(groups)
+        dispatch_batches(validator, groups, lambda idx, result: None, max_workers)
+    logging.info(f"预热完成: 共 {len(seen)} 个域名，新写入 {validator.store.writes} 条结论")
+
+def inspect_store(store: DomainStore, domain: str = None):
+    """打印结论库内容"""
+    now = time.time()
+    entries = store.entries(domain)
+    print("{:<40} {:<4} {:<5} {:<20} {:<20} {}".format(
+        '域名', 'MX', 'SMTP', '检查时间', '过期时间', 'MX服务器'))
+    for name, has_mx, smtp_valid, mx_records, checked_at, expires_at in entries:
+        print("{:<40} {:<4} {:<5} {:<20} {:<20} {}".format(
+            name[:40],
+            '✓' if has_mx else '✗',
+            '✓' if smtp_valid else '✗',
+            datetime.fromtimestamp(checked_at).strftime('%Y-%m-%d %H:%M:%S'),
+            datetime.fromtimestamp(expires_at).strftime('%Y-%m-%d %H:%M:%S')
+            + (' (已过期)' if expires_at <= now else ''),
+            ', '.join(mx_records[:3])))
+    expired = sum(1 for entry in entries if entry[5] <= now)
+    print(f"共 {len(entries)} 条，已过期 {expired} 条")
+
+def pipe_line(result: EmailResult, row: int, fmt: str) -> str:
+    """管道模式的一行输出；valid 格式下无效邮箱返回None"""
+    if fmt == 'valid':
+        return str(result.email) if result.is_valid else None
+    if fmt == 'jsonl':
+        return ResultLogSink.detail_line(result, row)
+    message = result.error_message.replace('\t', ' ').replace('\n', ' ')
+    return f"{result.email}\t{result.status.name}\t{result.error_code.name}\t{message}"
+
+def run_pipe(validator: EmailValidator, fmt: str = 'valid', max_workers: int = 10,
+             chunk_size: int = 1000, source=None, output=None):
+    """管道模式：从标准输入逐行读取邮箱，按输入顺序把结果写到标准输出，全程不导入pandas
+    
+    每读满 chunk_size 行按域名分组验证一次；fmt 为 valid（只输出有效邮箱）、tsv 或 jsonl。
+    """
+    source = source or sys.stdin
+    output = output or sys.stdout
+    stats = RunStats()
+    start_time = time.time()
+    row = 0
+    verdicts = {}  # 已验证域名的结论，跨批次沿用
+    
+    def flush(lines):
+        nonlocal row
+        results, groups = [], {}
+        for line in lines:
+            email = line.strip()
+            result = validator.new_result(email)
+            results.append(result)
+            domain = validator.precheck(result, email)
+            if domain is not None:
+                groups.setdefault(domain, []).append((len(results) - 1, result))
+        dispatch_batches(validator, groups, lambda idx, result: None, max_workers, verdicts)
+        
+        for result in results:
+            stats.record(result)
+            text = pipe_line(result, row, fmt)
+            row += 1
+            if text is not None:
+                output.write(text + '\n')
+        output.flush()
+    
+    try:
+        lines = []
+        for line in source:
+            lines.append(line)
+            if len(lines) >= chunk_size:
+                flush(lines)
+                lines = []
+        if lines:
+            flush(lines)
+    except BrokenPipeError:
+        # 下游（如head）提前退出；避免解释器退出时再次刷新stdout报错
+        os.dup2(os.open(os.devnull, os.O_WRONLY), output.fileno())
+        return
     
-    input_file = sys.argv[1]
-    process_file(input_file)
\ No newline at end of file
+    logging.info(f"管道模式完成: 共 {stats.processed} 个，有效 {stats.valid_count} 个，"
+                 f"耗时 {time.time() - start_time:.1f}秒")
+
+SHARD_ROW = 'shard_row'  # 分片文件中记录原文件行号的列
+
+def shard_path(input_file: str, index: int, count: int) -> str:
+    """分片文件路径，命名固定，便于在其他机器上运行后拷回合并"""
+    return f"{input_file}.shard-{index}-of-{count}.csv"
+
+def shard_of(emails, count: int):
+    """按域名的crc32哈希分配分片，同一域名总在同一分片（与进程、机器无关）"""
+    domains = emails.astype(str).str.strip().str.lower().str.rsplit('@', n=1).str[-1]
+    return domains.map(lambda domain: zlib.crc32(domain.encode('utf-8')) % count)
+
+def split_shards(input_file: str, count: int, chunk_size: int = 50000) -> list:
+    """将输入文件按域名哈希拆分为count个分片文件，每行附带原文件行号"""
+    paths = [shard_path(input_file, index, count) for index in range(count)]
+    written = [False] * count
+    for chunk in pd.read_csv(input_file, chunksize=chunk_size):
+        chunk.insert(0, SHARD_ROW, chunk.index)
+        shards = shard_of(chunk['email'], count)
+        for index, part in chunk.groupby(shards):
+            part.to_csv(paths[index], mode='a' if written[index] else 'w',
+                        header=not written[index], index=False)
+            written[index] = True
+    
+    # 没有分到数据的分片也生成只有表头的文件，保证合并时分片齐全
+    for index, path in enumerate(paths):
+        if not written[index]:
+            pd.DataFrame(columns=[SHARD_ROW, 'email']).to_csv(path, index=False)
+    logging.info(f"已拆分为 {count} 个分片: {input_file}.shard-*-of-{count}.csv")
+    return paths
+
+def merge_shards(input_file: str, count: int, chunk_size: int = 50000, remove: bool = True):
+    """将各分片的结果按原行号合并回原文件；按行号排序，结果与分片的完成顺序无关"""
+    paths = [shard_path(input_file, index, count) for index in range(count)]
+    missing = [path for path in paths if not os.path.exists(path)]
+    if missing:
+        raise FileNotFoundError(f"缺少分片文件: {', '.join(missing)}")
+    
+    frames = []
+    for path in paths:
+        frame = pd.read_csv(path, index_col=SHARD_ROW, keep_default_na=False, dtype=str)
+        frames.append(frame[[col for col in RESULT_COLUMNS if col in frame.columns]])
+    results = pd.concat(frames)
+    results.index = results.index.astype(int)
+    results = results[~results.index.duplicated(keep='last')].sort_index()
+    fields = [col for col in RESULT_COLUMNS if col in results.columns]
+    
+    merge_frame(input_file, results, fields, chunk_size)
+    if remove:
+        for path in paths:
+            os.remove(path)
+    logging.info(f"已合并 {count} 个分片的 {len(results)} 条结果到: {input_file}")
+
+def run_shards(input_file: str, count: int, argv: list, chunk_size: int = 50000,
+               split: bool = True):
+    """拆分后为每个分片启动一个子进程（沿用本次的命令行参数），全部成功后合并
+    
+    split=False 时沿用已有的分片文件，各子进程从自己的结果日志继续
+    """
+    if split:
+        split_shards(input_file, count, chunk_size)
+    procs = [subprocess.Popen([sys.executable, os.path.abspath(__file__)] + argv +
+                              ['--shard-index', str(index)])
+             for index in range(count)]
+    failed = [index for index, proc in enumerate(procs) if proc.wait() != 0]
+    if failed:
+        # 保留分片文件与结果日志，重新运行同一命令即可从中断处继续
+        raise RuntimeError(f"分片 {failed} 处理失败，分片文件已保留")
+    merge_shards(input_file, count, chunk_size)
+
+def main():
+    parser = argparse.ArgumentParser(description='批量验证CSV文件中的邮箱（结果写回原文件）')
+    parser.add_argument('input_file', nargs='?', help='包含email列的CSV文件')
+    parser.add_argument('--engine', choices=['thread', 'async'], default='thread',
+                        help='验证引擎：thread 线程池（默认），async 异步引擎')
+    parser.add_argument('--workers', type=int, default=10,
+                        help='线程引擎的工作线程数（默认10）')
+    parser.add_argument('--concurrency', type=int, default=500,
+                        help='异步引擎的全局并发上限（默认500）')
+    parser.add_argument('--per-host', type=int, default=10,
+                        help='异步引擎中每个MX主机的并发上限（默认10）')
+    parser.add_argument('--timeout', type=int, default=5,
+                        help='DNS与SMTP超时秒数（默认5）')
+    parser.add_argument('--smtp-race', action='store_true',
+                        help='并行竞速多个MX主机与端口，取第一个成功的连接')
+    parser.add_argument('--race-stagger', type=float, default=0.25,
+                        help='竞速模式下相邻尝试的启动间隔秒数（默认0.25）')
+    parser.add_argument('--smtp-deadline', type=float, default=15,
+                        help='竞速模式下每个域名SMTP验证的整体时限秒数（默认15）')
+    parser.add_argument('--stream', action='store_true',
+                        help='流式模式：分块读取，结果追加写入结果文件，结束时合并回原文件')
+    parser.add_argument('--chunk-size', type=int, default=50000,
+                        help='流式模式每块读取的行数（默认50000）')
+    parser.add_argument('--results-file',
+                        help='结果日志路径（默认 <输入文件>.results.csv），中断后再次运行会跳过已完成的行')
+    parser.add_argument('--restart', action='store_true',
+                        help='丢弃已有的结果日志，从头验证')
+    parser.add_argument('--store',
+                        help='域名结论库（SQLite）路径，跨运行复用MX与SMTP可达性结论')
+    parser.add_argument('--store-ttl', type=float, default=168,
+                        help='SMTP可达结论的有效期小时数（默认168）')
+    parser.add_argument('--store-negative-ttl', type=float, default=24,
+                        help='不可达结论的有效期小时数（默认24）')
+    parser.add_argument('--store-warm', action='store_true',
+                        help='只验证输入文件中的域名并写入结论库，不修改输入文件')
+    parser.add_argument('--store-inspect', nargs='?', const='', metavar='DOMAIN',
+                        help='查看结论库内容（可指定域名）')
+    parser.add_argument('--store-purge', nargs='?', const='expired', metavar='expired|all|DOMAIN',
+                        help='清理结论库：expired 已过期的（默认），all 全部，或指定域名')
+    parser.add_argument('--smtp-pool', action='store_true',
+                        help='复用到同一MX主机的SMTP会话（线程引擎；异步引擎仅用于RCPT探测）')
+    parser.add_argument('--pool-size', type=int, default=4,
+                        help='每个MX主机端口保留的空闲会话数（默认4）')
+    parser.add_argument('--pool-idle-timeout', type=float, default=30,
+                        help='会话空闲超过该秒数后不再复用（默认30）')
+    parser.add_argument('--rcpt-probe', action='store_true',
+                        help='在会话中批量发送RCPT TO，探测每个邮箱是否存在')
+    parser.add_argument('--mail-from', default='',
+                        help='RCPT探测使用的发件人（默认空发件人 <>）')
+    parser.add_argument('--rcpt-batch', type=int, default=50,
+                        help='每个MAIL FROM事务中探测的收件人数（默认50）')
+    parser.add_argument('--metrics-file',
+                        help='定期写入分阶段耗时、吞吐与并发数快照的文件')
+    parser.add_argument('--metrics-format', choices=['json', 'prometheus'], default='json',
+                        help='快照格式（默认json）')
+    parser.add_argument('--metrics-interval', type=float, default=10,
+                        help='快照写入间隔秒数（默认10）')
+    parser.add_argument('--circuit-breaker', action='store_true',
+                        help='按MX主机熔断并自适应调整并发（替代固定的 --per-host）')
+    parser.add_argument('--breaker-threshold', type=int, default=5,
+                        help='连续失败多少次后熔断（默认5）')
+    parser.add_argument('--breaker-cooldown', type=float, default=60,
+                        help='熔断后多少秒再放行探测（默认60）')
+    parser.add_argument('--host-max-concurrency', type=int, default=10,
+                        help='自适应并发的每主机上限（默认10）')
+    parser.add_argument('--target-latency', type=float, default=2.0,
+                        help='超过该秒数的平均延迟会降低主机并发（默认2.0）')
+    parser.add_argument('--nameservers',
+                        help='上游DNS，逗号分隔，可写作 地址#端口（默认 8.8.8.8,1.1.1.1）')
+    parser.add_argument('--dns-race', action='store_true',
+                        help='同时向多个上游DNS查询，取最先的有效应答，并按延迟与失败率优先选择上游')
+    parser.add_argument('--dns-fanout', type=int, default=2,
+                        help='同时查询的上游数（默认2）')
+    parser.add_argument('--dns-attempt-timeout', type=float, default=1.5,
+                        help='单个上游多少秒未应答就补发给下一个（默认1.5）')
+    parser.add_argument('--local-resolver', metavar='ADDR[#PORT]',
+                        help='本地缓存DNS，状况良好时优先查询（需要 --dns-race）')
+    parser.add_argument('--quiet', action='store_true',
+                        help='不逐条输出结果，只定期输出一行进度')
+    parser.add_argument('--progress-interval', type=float, default=10,
+                        help='安静模式下进度的输出间隔秒数（默认10）')
+    parser.add_argument('--detail-log',
+                        help='将每条结果以JSON行追加写入该文件')
+    parser.add_argument('--pipe', action='store_true',
+                        help='管道模式：从标准输入逐行读取邮箱，结果写到标准输出（不加载pandas）')
+    parser.add_argument('--pipe-format', choices=['valid', 'tsv', 'jsonl'], default='valid',
+                        help='管道模式输出：valid 只输出有效邮箱（默认），tsv 邮箱/结论/错误类型/说明，jsonl 明细')
+    parser.add_argument('--pipe-batch', type=int, default=1000,
+                        help='管道模式每读满多少行验证一次（默认1000）')
+    parser.add_argument('--shards', type=int,
+                        help='按域名哈希拆分为N个分片，每个分片一个进程并行验证，结束后合并')
+    parser.add_argument('--shard-split', type=int, metavar='N',
+                        help='只拆分为N个分片文件（可拷到多台机器上分别验证）')
+    parser.add_argument('--shard-merge', type=int, metavar='N',
+                        help='将N个分片文件的结果合并回输入文件')
+    parser.add_argument('--shard-index', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.shard_split or args.shard_merge:
+        if not args.input_file:
+            parser.error('需要指定输入文件')
+        if args.shard_split:
+            split_shards(args.input_file, args.shard_split, args.chunk_size)
+        else:
+            merge_shards(args.input_file, args.shard_merge, args.chunk_size)
+        return
+    if args.shards and args.shard_index is None:
+        if not args.input_file:
+            parser.error('需要指定输入文件')
+        if args.results_file or args.store_warm:
+            parser.error('--shards 不能与 --results-file/--store-warm 同时使用')
+        # 上次未完成时保留分片文件与结果日志继续，不重新拆分
+        resume = os.path.exists(shard_path(args.input_file, 0, args.shards)) and not args.restart
+        if resume:
+            logging.info("发现上次未完成的分片，继续处理")
+        run_shards(args.input_file, args.shards, sys.argv[1:], args.chunk_size, split=not resume)
+        return
+    if args.shard_index is not None:
+        # 子进程：处理对应的分片文件，耗时快照各写各的
+        args.input_file = shard_path(args.input_file, args.shard_index, args.shards)
+        if args.metrics_file:
+            args.metrics_file = f"{args.metrics_file}.shard-{args.shard_index}"
+        if args.detail_log:
+            args.detail_log = f"{args.detail_log}.shard-{args.shard_index}"
+    
+    store = None
+    if args.store:
+        store = DomainStore(args.store, ttl=args.store_ttl * 3600,
+                            negative_ttl=args.store_negative_ttl * 3600)
+    elif args.store_warm or args.store_inspect is not None or args.store_purge:
+        parser.error('--store-warm/--store-inspect/--store-purge 需要同时指定 --store')
+    
+    if args.store_purge:
+        print(f"已删除 {store.purge(args.store_purge)} 条结论")
+    if args.store_inspect is not None:
+        inspect_store(store, args.store_inspect or None)
+    if (args.store_purge or args.store_inspect is not None) and not (args.input_file or args.pipe):
+        return
+    if not args.input_file and not args.pipe:
+        parser.error('需要指定输入文件')
+    
+    options = {
+        'timeout': args.timeout,
+        'smtp_race': args.smtp_race,
+        'race_stagger': args.race_stagger,
+        'smtp_deadline': args.smtp_deadline,
+        'store': store,
+        'rcpt_probe': args.rcpt_probe,
+        'mail_from': args.mail_from,
+        'rcpt_batch': args.rcpt_batch,
+    }
+    if args.circuit_breaker:
+        options['host_health'] = HostHealth(failure_threshold=args.breaker_threshold,
+                                            cooldown=args.breaker_cooldown,
+                                            max_limit=args.host_max_concurrency,
+                                            target_latency=args.target_latency)
+    if args.nameservers:
+        options['nameservers'] = [server.strip() for server in args.nameservers.split(',') if server.strip()]
+    if not args.dns_race and '#' in (args.nameservers or ''):
+        parser.error('地址#端口 的写法需要同时指定 --dns-race')
+    if args.dns_race:
+        pool_options = {'nameservers': options['nameservers']} if args.nameservers else {}
+        options['resolver_pool'] = ResolverPool(local=args.local_resolver, fanout=args.dns_fanout,
+                                                attempt_timeout=min(args.dns_attempt_timeout, args.timeout),
+                                                lifetime=args.timeout, **pool_options)
+    elif args.local_resolver:
+        parser.error('--local-resolver 需要同时指定 --dns-race')
+    if args.smtp_pool or args.rcpt_probe:
+        options['smtp_pool'] = SMTPPool(max_idle_per_host=args.pool_size,
+                                        idle_timeout=args.pool_idle_timeout)
+    if args.engine == 'async':
+        validator = AsyncEmailValidator(concurrency=args.concurrency,
+                                        per_host=args.per_host, **options)
+    else:
+        validator = EmailValidator(**options)
+    
+    try:
+        if args.pipe:
+            run_pipe(validator, fmt=args.pipe_format, max_workers=args.workers,
+                     chunk_size=args.pipe_batch)
+        elif args.store_warm:
+            warm_store(args.input_file, validator, max_workers=args.workers,
+                       chunk_size=args.chunk_size)
+        else:
+            process_file(args.input_file, max_workers=args.workers, validator=validator,
+                         stream=args.stream, chunk_size=args.chunk_size,
+                         results_file=args.results_file, resume=not args.restart,
+                         metrics_file=args.metrics_file, metrics_format=args.metrics_format,
+                         metrics_interval=args.metrics_interval, quiet=args.quiet,
+                         detail_log=args.detail_log, progress_interval=args.progress_interval)
+    finally:
+        validator.close()
+
+if __name__ == "__main__":
+    main()